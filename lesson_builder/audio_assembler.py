@@ -0,0 +1,484 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from pydub import AudioSegment
+from pydub.utils import mediainfo
+
+from metrics import metrics
+
+PCM_FORMATS = {1: "u8", 2: "s16le", 4: "s32le"}
+
+def scratch_root() -> str:
+    """Where jobs keep their scratch files: tmpfs (/dev/shm) when available, else the system temp dir."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+def make_scratch_dir(prefix: str = "audio_job_") -> tempfile.TemporaryDirectory:
+    """A private scratch directory for one job, removed when the context exits."""
+    return tempfile.TemporaryDirectory(prefix=prefix, dir=scratch_root())
+
+def move_into_place(src: Union[str, Path], dest: Union[str, Path]) -> None:
+    """Move a finished file to dest atomically, also when src is on another filesystem."""
+    dest = Path(dest)
+    try:
+        os.replace(src, dest)
+    except OSError:
+        staged = dest.with_name(f".{dest.name}.part")
+        shutil.copyfile(src, staged)
+        os.replace(staged, dest)
+        os.unlink(src)
+
+class Mp3StreamWriter:
+    """
+    Encodes PCM to mp3 as it is produced by piping it into one ffmpeg process,
+    so the full recording never has to be held in memory. The file is written
+    under a temporary name (in scratch_dir if given, else next to path) and
+    moved into place on a successful close.
+    """
+    def __init__(self, path: Union[str, Path], frame_rate: int, channels: int, sample_width: int, bitrate: Optional[str] = None, scratch_dir: Optional[Union[str, Path]] = None):
+        self.path = Path(path)
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frames = 0
+        self._encode_seconds = 0.0
+        self._tmp_path = (Path(scratch_dir) if scratch_dir else self.path.parent) / f".{self.path.name}.part"
+        self._stderr = tempfile.TemporaryFile()
+        command = [
+            AudioSegment.converter, "-y", "-loglevel", "error",
+            "-f", PCM_FORMATS[sample_width], "-ar", str(frame_rate), "-ac", str(channels),
+            "-i", "pipe:0",
+        ]
+        if bitrate:
+            command += ["-b:a", bitrate]
+        command += ["-f", "mp3", str(self._tmp_path)]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    @property
+    def frame_width(self) -> int:
+        return self.channels * self.sample_width
+
+    def write(self, pcm: bytes) -> None:
+        start = time.perf_counter()
+        self._process.stdin.write(pcm)
+        self._encode_seconds += time.perf_counter() - start
+        self.frames += len(pcm) // self.frame_width
+
+    def close(self) -> None:
+        """Finish encoding and move the file into place. Raises RuntimeError if ffmpeg failed."""
+        start = time.perf_counter()
+        self._process.stdin.close()
+        returncode = self._process.wait()
+        # Time spent waiting on the encoder, once per file
+        metrics.observe("audio.encode", self._encode_seconds + time.perf_counter() - start)
+        if returncode != 0:
+            self._stderr.seek(0)
+            error = self._stderr.read().decode(errors="replace").strip()
+            self._stderr.close()
+            if self._tmp_path.exists():
+                self._tmp_path.unlink()
+            raise RuntimeError(f"ffmpeg exited with {returncode}: {error}")
+        self._stderr.close()
+        move_into_place(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Stop encoding and discard the partial file."""
+        self._process.kill()
+        self._process.wait()
+        self._stderr.close()
+        if self._tmp_path.exists():
+            self._tmp_path.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class ChunkedMp3Writer:
+    """
+    Encodes PCM into consecutive mp3 files of at most chunk_duration_ms each
+    (chunk_1.mp3, chunk_2.mp3, ... in output_folder), streaming every chunk
+    like Mp3StreamWriter.
+    """
+    def __init__(self, output_folder: Union[str, Path], chunk_duration_ms: int, frame_rate: int, channels: int, sample_width: int, bitrate: Optional[str] = None, scratch_dir: Optional[Union[str, Path]] = None):
+        self.output_folder = Path(output_folder)
+        self.output_folder.mkdir(exist_ok=True)
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.bitrate = bitrate
+        self.scratch_dir = scratch_dir
+        self.chunk_bytes = int(chunk_duration_ms * frame_rate / 1000) * self.frame_width
+        self.chunks: List[str] = []
+        self.frames = 0
+        self._writer: Optional[Mp3StreamWriter] = None
+        self._written = 0
+
+    @property
+    def frame_width(self) -> int:
+        return self.channels * self.sample_width
+
+    def write(self, pcm: bytes) -> None:
+        view = memoryview(pcm)
+        self.frames += len(view) // self.frame_width
+        while len(view):
+            if self._writer is None:
+                chunk_filename = self.output_folder / f"chunk_{len(self.chunks) + 1}.mp3"
+                self._writer = Mp3StreamWriter(chunk_filename, self.frame_rate, self.channels, self.sample_width,
+                                               self.bitrate, self.scratch_dir)
+                self.chunks.append(str(chunk_filename))
+                self._written = 0
+            take = min(len(view), self.chunk_bytes - self._written)
+            self._writer.write(view[:take])
+            self._written += take
+            view = view[take:]
+            if self._written == self.chunk_bytes:
+                self._writer.close()
+                self._writer = None
+
+    def close(self) -> None:
+        """Finish the last chunk. Raises RuntimeError if ffmpeg failed."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def abort(self) -> None:
+        """Stop encoding and discard the partial chunk."""
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def match_format(segment: AudioSegment, frame_rate: int, channels: int, sample_width: int) -> AudioSegment:
+    """Convert a segment to the given PCM format (a no-op if it already matches)."""
+    return segment.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+
+def stream_concat(files: Iterable[Union[str, Path]], output: Union[str, Path], bitrate: Optional[str] = None, scratch_dir: Optional[Union[str, Path]] = None) -> List[int]:
+    """
+    Concatenate audio files into one mp3, decoding one input at a time.
+
+    Peak memory is bounded by the largest single input rather than the total.
+
+    Returns:
+        Start offset in milliseconds of each input within the output, in order
+    """
+    writer = None
+    offsets = []
+    try:
+        for path in files:
+            segment = AudioSegment.from_file(str(path))
+            if writer is None:
+                writer = Mp3StreamWriter(output, segment.frame_rate, segment.channels, segment.sample_width, bitrate, scratch_dir)
+            segment = match_format(segment, writer.frame_rate, writer.channels, writer.sample_width)
+            offsets.append(int(round(writer.frames * 1000 / writer.frame_rate)))
+            writer.write(segment.raw_data)
+            del segment
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+    return offsets
+
+def audio_duration_ms(path: Union[str, Path]) -> int:
+    """Playable duration of an audio file, as reported by ffprobe (the encoder delay excluded)."""
+    info = mediainfo(str(path))
+    return int(round((float(info.get("duration") or 0) - float(info.get("start_time") or 0)) * 1000))
+
+def concat_copy(files: List[Union[str, Path]], output: Union[str, Path], scratch_dir: Optional[Union[str, Path]] = None) -> None:
+    """
+    Join mp3 files without re-encoding, using ffmpeg's concat demuxer with stream copy.
+
+    All inputs must share codec, sample rate and channel count.
+    """
+    output = Path(output)
+    tmp_path = (Path(scratch_dir) if scratch_dir else output.parent) / f".{output.name}.part"
+    fd, list_path = tempfile.mkstemp(suffix=".txt", prefix="concat_", dir=scratch_dir)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for path in files:
+                escaped = str(Path(path).resolve()).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        command = [
+            AudioSegment.converter, "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-map", "0:a", "-c", "copy", "-f", "mp3", str(tmp_path)
+        ]
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {result.returncode}: {result.stderr.decode(errors='replace').strip()}")
+        move_into_place(tmp_path, output)
+    finally:
+        os.unlink(list_path)
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+@metrics.timed("audio.concat")
+def concat_audio(files: List[Union[str, Path]], output: Union[str, Path], bitrate: Optional[str] = None, scratch_dir: Optional[Union[str, Path]] = None) -> List[int]:
+    """
+    Concatenate audio files into one mp3, losslessly where possible.
+
+    When every input is an mp3 with the same sample rate and channel count (the
+    normal case, as all sections come from the same TTS model), the frames are
+    copied as-is. Otherwise the inputs are decoded and re-encoded with stream_concat().
+
+    Returns:
+        Start offset in milliseconds of each input's audio within the output, in order
+    """
+    infos = [mediainfo(str(path)) for path in files]
+    formats = {(info.get("codec_name"), info.get("sample_rate"), info.get("channels")) for info in infos}
+    if len(formats) == 1 and next(iter(formats))[0] == "mp3" and bitrate is None:
+        try:
+            concat_copy(files, output, scratch_dir)
+            # Copied files keep their encoder delay, which the decoder only skips at the
+            # start of the output. Each input's audio therefore begins after all earlier
+            # frames, less the first file's skipped delay, plus its own delay.
+            offsets = []
+            elapsed = 0.0
+            first_skip = float(infos[0].get("start_time") or 0)
+            for info in infos:
+                offsets.append(int(round((elapsed - first_skip + float(info.get("start_time") or 0)) * 1000)))
+                elapsed += float(info.get("duration") or 0)
+            return offsets
+        except RuntimeError as e:
+            print(f"Stream copy failed ({e}), re-encoding instead")
+    else:
+        print("Input formats differ, re-encoding")
+    return stream_concat(files, output, bitrate, scratch_dir)
+
+class PcmPool:
+    """
+    Run-scoped store of decoded PCM, shared by every lesson assembled in a run.
+
+    Across a course only a handful of distinct pauses exist and the same phrase
+    clips recur in many transcripts, so clips are decoded once per run, pauses
+    are built once per (duration, format) and repeated placements are built
+    once per (clip, repeat, delay). Clips and repeat templates are evicted least
+    recently used first once they exceed max_bytes.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._formats: Dict[str, Tuple[int, int, int]] = {}
+        self._frames: Dict[Tuple[str, Tuple[int, int, int]], int] = {}
+        self._silences: Dict[Tuple[int, Tuple[int, int, int]], bytes] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            pcm = self._entries.get(key)
+            if pcm is None:
+                self.misses += 1
+                metrics.count("audio.pcm_pool.misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.count("audio.pcm_pool.hits")
+        return pcm
+
+    def _put(self, key: tuple, pcm: bytes) -> bytes:
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = pcm
+                self.size += len(pcm)
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+            return self._entries.get(key, pcm)
+
+    def native_format(self, path: Union[str, Path]) -> Optional[Tuple[int, int, int]]:
+        """The (frame rate, channels, sample width) of a clip decoded earlier, if any."""
+        return self._formats.get(str(path))
+
+    def clip(self, path: Union[str, Path], fmt: Optional[Tuple[int, int, int]] = None) -> Tuple[bytes, Tuple[int, int, int]]:
+        """
+        PCM of an audio file in the given format, decoded at most once per run.
+
+        Args:
+            path: Audio file to decode
+            fmt: (frame rate, channels, sample width), or None for the file's own format
+
+        Returns:
+            The PCM and the format it is in
+        """
+        key = str(path)
+        fmt = fmt or self._formats.get(key)
+        if fmt is not None:
+            pcm = self._get(("clip", key, fmt))
+            if pcm is not None:
+                return pcm, fmt
+        with metrics.timer("audio.decode"):
+            segment = AudioSegment.from_file(key)
+        native = (segment.frame_rate, segment.channels, segment.sample_width)
+        self._formats[key] = native
+        fmt = fmt or native
+        return self._put(("clip", key, fmt), match_format(segment, *fmt).raw_data), fmt
+
+    def clip_frames(self, path: Union[str, Path], fmt: Optional[Tuple[int, int, int]] = None) -> Tuple[int, Tuple[int, int, int]]:
+        """
+        Length in frames of an audio file in the given format. Lengths outlive
+        eviction, so a clip is only decoded for this if the pool never saw it.
+
+        Returns:
+            The length and the format it applies to
+        """
+        key = str(path)
+        fmt = fmt or self._formats.get(key)
+        frames = self._frames.get((key, fmt)) if fmt is not None else None
+        if frames is None:
+            pcm, fmt = self.clip(path, fmt)
+            frames = len(pcm) // (fmt[1] * fmt[2])
+            self._frames[(key, fmt)] = frames
+        return frames, fmt
+
+    def silence(self, duration_ms: int, fmt: Tuple[int, int, int]) -> bytes:
+        """Zero-filled PCM of the given duration, shared between all uses."""
+        key = (duration_ms, fmt)
+        pcm = self._silences.get(key)
+        if pcm is None:
+            frame_rate, channels, sample_width = fmt
+            frames = int(round(duration_ms * frame_rate / 1000))
+            pcm = self._silences.setdefault(key, bytes(frames * channels * sample_width))
+        return pcm
+
+    def template(self, path: Union[str, Path], repeat: int, delay_ms: int, fmt: Tuple[int, int, int]) -> bytes:
+        """A clip placed repeat times, each followed by a pause of delay_ms, built once per run."""
+        key = ("template", str(path), repeat, delay_ms, fmt)
+        pcm = self._get(key)
+        if pcm is None:
+            clip, _ = self.clip(path, fmt)
+            pcm = self._put(key, (clip + self.silence(delay_ms, fmt)) * repeat)
+        return pcm
+
+    def report(self) -> None:
+        """Print how often decoded audio was reused in this run."""
+        lookups = self.hits + self.misses
+        if lookups:
+            print(f"\nPCM pool: {self.hits}/{lookups} reused ({self.hits / lookups:.0%}), "
+                  f"{len(self._entries)} entries, {self.size / 1e6:.1f} MB, "
+                  f"{len(self._silences)} distinct pauses")
+
+class PcmAssembler:
+    """
+    Streams a lesson of clips and pauses into an encoder in time linear in its length.
+
+    Concatenating AudioSegments with += copies everything assembled so far on
+    every step, and holds the whole lesson in memory. Instead, clips, pauses and
+    repeated placements come from a PcmPool (pass one pool to every assembler in
+    a run to share them between lessons) and each placement is written to the
+    open writer as soon as it is made, so beyond the pool only the clip being
+    placed is held.
+
+    The length of a placement is known before its audio is needed (see
+    clip_frames), so callers can measure a whole lesson first, choose between a
+    single mp3 and chunks, then open() the writer and place the rows.
+    """
+    def __init__(self, frame_rate: Optional[int] = None, channels: Optional[int] = None, sample_width: Optional[int] = None, pool: Optional[PcmPool] = None):
+        # The output format defaults to that of the first clip measured or added
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.pool = pool if pool is not None else PcmPool()
+        self.writer: Optional[Union[Mp3StreamWriter, ChunkedMp3Writer]] = None
+        self.frames = 0
+
+    @property
+    def frame_width(self) -> int:
+        return self.channels * self.sample_width
+
+    @property
+    def fmt(self) -> Optional[Tuple[int, int, int]]:
+        return (self.frame_rate, self.channels, self.sample_width) if self.frame_rate else None
+
+    @property
+    def duration_ms(self) -> int:
+        return self.frames_to_ms(self.frames)
+
+    def open(self, writer: Union[Mp3StreamWriter, ChunkedMp3Writer]) -> None:
+        """Write every following placement to writer. Closing it is left to the caller."""
+        self.writer = writer
+
+    def _set_format(self, fmt: Tuple[int, int, int]) -> None:
+        if self.frame_rate is None:
+            self.frame_rate, self.channels, self.sample_width = fmt
+
+    def load_clip(self, path: Union[str, Path]) -> bytes:
+        """Decode an audio file to PCM in the output format, once per pool."""
+        pcm, fmt = self.pool.clip(path, self.fmt)
+        self._set_format(fmt)
+        return pcm
+
+    def silence(self, duration_ms: int) -> bytes:
+        """Zero-filled PCM of the given duration, shared between all uses."""
+        return self.pool.silence(duration_ms, self.fmt)
+
+    def silence_frames(self, duration_ms: int) -> int:
+        return int(round(duration_ms * self.frame_rate / 1000)) if duration_ms > 0 and self.frame_rate else 0
+
+    def placement_frames(self, frames: int, repeat: int = 1, delay_ms: int = 0) -> int:
+        """Frames taken by placing frames of audio repeat times, each followed by a pause of delay_ms."""
+        return repeat * (frames + self.silence_frames(delay_ms))
+
+    def clip_frames(self, path: Union[str, Path], repeat: int = 1, delay_ms: int = 0) -> int:
+        """Frames add_clip(path, repeat, delay_ms) will take, without holding on to the audio."""
+        frames, fmt = self.pool.clip_frames(path, self.fmt)
+        self._set_format(fmt)
+        return self.placement_frames(frames, repeat, delay_ms)
+
+    def append_pcm(self, pcm: bytes) -> None:
+        if self.writer is None:
+            raise RuntimeError("open() the assembler before placing audio")
+        self.writer.write(pcm)
+        self.frames += len(pcm) // self.frame_width
+
+    def add_silence(self, duration_ms: int) -> None:
+        if duration_ms > 0 and self.frame_rate:
+            self.append_pcm(self.silence(duration_ms))
+
+    def frames_to_ms(self, frames: int) -> int:
+        return int(round(frames * 1000 / self.frame_rate)) if self.frame_rate else 0
+
+    def add_clip(self, path: Union[str, Path], repeat: int = 1, delay_ms: int = 0) -> Tuple[int, int]:
+        """
+        Place a clip repeat times, each followed by a pause of delay_ms.
+
+        Returns:
+            The first and one-past-last frame of the placement, pauses included
+        """
+        pcm = self.load_clip(path)
+        if repeat > 1:
+            start = self.frames
+            self.append_pcm(self.pool.template(path, repeat, max(delay_ms, 0), self.fmt))
+            return start, self.frames
+        return self.add_pcm(pcm, repeat, delay_ms)
+
+    def add_pcm(self, pcm: bytes, repeat: int = 1, delay_ms: int = 0) -> Tuple[int, int]:
+        """Place PCM already in the output format repeat times, each followed by a pause of delay_ms."""
+        start = self.frames
+        for _ in range(repeat):
+            self.append_pcm(pcm)
+            self.add_silence(delay_ms)
+        return start, self.frames
@@ -0,0 +1,240 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from create_weekly_lessons import generate_daily_lesson_plans
+from generate_lesson_claude import is_retryable_error, process_lesson_plans
+from metrics import metrics
+from rate_limiter import RateLimiter
+from stub_servers import ClaudeStubConfig, TTSStubConfig, start_claude_stub, start_tts_stub
+from transcribe_audio_eleven_labs import combine_directory, process_directory
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_RESULTS = "benchmarks/results.jsonl"
+LESSONS_PER_PART = 3
+
+def make_course(content_config: Dict[str, Any], lessons: int) -> Dict[str, Any]:
+    """
+    A course of the given size, cycling through the lessons of an existing one.
+
+    Lessons are numbered three to a part like the real course (1.1, 1.2, 1.3, 2.1, ...).
+    """
+    source = content_config["lessons"]
+    course = []
+    for i in range(lessons):
+        lesson = dict(source[i % len(source)])
+        lesson["lesson_number"] = float(f"{i // LESSONS_PER_PART + 1}.{i % LESSONS_PER_PART + 1}")
+        course.append(lesson)
+    return {**content_config, "lessons": course}
+
+def prepare_workspace(workdir: Path) -> None:
+    """Copy the resources the pipeline reads through relative paths into workdir."""
+    (workdir / "resources").mkdir(parents=True)
+    shutil.copy(REPO_ROOT / "resources" / "voice_config.json", workdir / "resources" / "voice_config.json")
+    shutil.copytree(REPO_ROOT / "lesson_builder" / "prompts", workdir / "lesson_builder" / "prompts")
+
+def count_files(base_dir: Path, pattern: str) -> int:
+    return sum(1 for _ in base_dir.glob(pattern))
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class StubStats:
+    """Difference in a stub server's request counters across a stage."""
+    def __init__(self, server):
+        self.server = server
+        self.before = dict(server.stats)
+
+    def delta(self) -> Dict[str, int]:
+        with self.server.lock:
+            return {key: value - self.before.get(key, 0) for key, value in self.server.stats.items()}
+
+def run_scale(
+    lessons: int,
+    content_config: Dict[str, Any],
+    structure_config: Dict[str, Any],
+    claude_server,
+    tts_server,
+    settings: Dict[str, Any],
+    verbose: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Run every stage of the pipeline once on a fresh course of the given size.
+
+    Args:
+        lessons: Number of lessons in the course
+        content_config: Lessons content config to build the course from
+        structure_config: Weekly structure config
+        claude_server: Running Claude stub
+        tts_server: Running ElevenLabs stub
+        settings: Worker counts and client budgets (see main)
+        verbose: Show the pipeline's own output
+
+    Returns:
+        List[Dict[str, Any]]: One result per stage
+    """
+    course = make_course(content_config, lessons)
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix=f"lesson_bench_{lessons}_") as tmp:
+        workdir = Path(tmp)
+        prepare_workspace(workdir)
+        base_dir = workdir / "danish"
+        os.chdir(workdir)
+        try:
+            rate_limiter = RateLimiter(
+                requests_per_minute=settings["client_rpm"],
+                input_tokens_per_minute=1e12,
+                output_tokens_per_minute=1e12,
+                is_retryable=is_retryable_error
+            )
+            stages: List[Tuple[str, Callable[[], Any], str, Any]] = [
+                ("plans", lambda: generate_daily_lesson_plans(
+                    course, structure_config, "danish", workers=settings["plan_workers"]),
+                 "*/*/daily_plans/*.json", None),
+                ("transcripts", lambda: process_lesson_plans(
+                    "danish", max_workers=settings["claude_workers"], rate_limiter=rate_limiter,
+                    base_url=claude_server.base_url),
+                 "*/*/daily_transcripts/*.csv", claude_server),
+                ("audio", lambda: process_directory(
+                    "danish", max_workers=settings["tts_workers"], processes=settings["processes"]),
+                 "*/*/audio/*.mp3", tts_server),
+                ("combine", lambda: combine_directory("danish", processes=settings["processes"]),
+                 "*/*/combined_audio/*.mp3", None),
+            ]
+            for name, stage, outputs, server in stages:
+                stats = StubStats(server) if server is not None else None
+                quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+                with quiet:
+                    start = time.perf_counter()
+                    stage()
+                    seconds = time.perf_counter() - start
+                items = count_files(base_dir, outputs)
+                result = {
+                    "stage": name,
+                    "lessons": lessons,
+                    "items": items,
+                    "seconds": round(seconds, 4),
+                    "items_per_sec": round(items / seconds, 2) if seconds > 0 else None
+                }
+                if stats is not None:
+                    result["stub"] = stats.delta()
+                results.append(result)
+                print(f"  {name:<12} {items:6d} files in {seconds:8.2f}s")
+        finally:
+            os.chdir(cwd)
+    return results
+
+def load_results(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def previous_result(history: List[Dict[str, Any]], result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The latest earlier result for the same stage, course size and settings."""
+    for record in reversed(history):
+        if (record["stage"], record["lessons"], record["settings"]) == (result["stage"], result["lessons"], result["settings"]):
+            return record
+    return None
+
+def print_summary(results: List[Dict[str, Any]], history: List[Dict[str, Any]]) -> None:
+    print(f"\n{'stage':<12} {'lessons':>7} {'files':>6} {'seconds':>9} {'files/s':>9} {'vs last':>9}")
+    for result in results:
+        previous = previous_result(history, result)
+        change = ""
+        if previous is not None and previous["seconds"] > 0:
+            change = f"{(result['seconds'] / previous['seconds'] - 1) * 100:+.1f}%"
+        rate = result["items_per_sec"]
+        print(f"{result['stage']:<12} {result['lessons']:>7} {result['items']:>6} {result['seconds']:>9.2f} "
+              f"{rate if rate is not None else '-':>9} {change:>9}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Time every pipeline stage against local Claude and ElevenLabs stand-ins')
+    parser.add_argument('--lessons', type=int, nargs='+', default=list(DEFAULT_SCALES), help='Course sizes to run (default: 1 10 100)')
+    parser.add_argument('--results', default=DEFAULT_RESULTS, help='JSONL file results are appended to')
+    parser.add_argument('--content', default='resources/lessons_content_config.json', help='Lessons content config to build courses from')
+    parser.add_argument('--structure', default='resources/weekly_structure_config.json', help='Weekly structure config')
+    parser.add_argument('--plan-workers', type=int, default=8, help='Threads writing daily plans')
+    parser.add_argument('--claude-workers', type=int, default=8, help='Concurrent Claude requests')
+    parser.add_argument('--client-rpm', type=float, default=100000, help='Client-side Claude requests per minute budget')
+    parser.add_argument('--tts-workers', type=int, default=4, help='Concurrent text-to-speech requests')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes for rendering and combining audio')
+    parser.add_argument('--claude-latency-ms', type=int, default=0, help='Claude stub delay per message')
+    parser.add_argument('--claude-rpm', type=float, default=None, help='Claude stub requests per minute before 429')
+    parser.add_argument('--filler-rows', type=int, default=0, help='Extra rows per stub transcript')
+    parser.add_argument('--tts-latency-ms', type=int, default=0, help='ElevenLabs stub delay per clip')
+    parser.add_argument('--tts-rpm', type=float, default=None, help='ElevenLabs stub requests per minute before 429')
+    parser.add_argument('--tts-concurrency', type=int, default=None, help='ElevenLabs stub requests in flight before 429')
+    parser.add_argument('--ms-per-char', type=float, default=60.0, help='Stub speech duration per character')
+    parser.add_argument('--verbose', action='store_true', help="Show the pipeline's own output")
+    parser.add_argument('--metrics', help='Also record per-call metrics to this JSONL file and print their summary')
+
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.configure(Path(args.metrics).resolve())
+
+    claude_config = ClaudeStubConfig(latency_ms=args.claude_latency_ms, requests_per_minute=args.claude_rpm,
+                                     filler_rows=args.filler_rows)
+    tts_config = TTSStubConfig(latency_ms=args.tts_latency_ms, ms_per_char=args.ms_per_char,
+                               requests_per_minute=args.tts_rpm, max_concurrent=args.tts_concurrency)
+    settings = {
+        "plan_workers": args.plan_workers,
+        "claude_workers": args.claude_workers,
+        "client_rpm": args.client_rpm,
+        "tts_workers": args.tts_workers,
+        "processes": args.processes,
+        "claude_stub": vars(claude_config),
+        "tts_stub": vars(tts_config)
+    }
+
+    claude_server = start_claude_stub(config=claude_config)
+    tts_server = start_tts_stub(config=tts_config)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    os.environ.setdefault("ELEVENLABS_API_KEY", "benchmark")
+    os.environ["ELEVENLABS_BASE_URL"] = tts_server.base_url
+
+    with open(args.content, 'r', encoding='utf-8') as f:
+        content_config = json.load(f)
+    with open(args.structure, 'r', encoding='utf-8') as f:
+        structure_config = json.load(f)
+
+    results_path = Path(args.results).resolve()
+    history = load_results(results_path)
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count()
+    }
+
+    results = []
+    for lessons in args.lessons:
+        print(f"\nBenchmarking {lessons} lessons...")
+        for result in run_scale(lessons, content_config, structure_config, claude_server, tts_server, settings, args.verbose):
+            results.append({**run, **result, "settings": settings})
+
+    print_summary(results, history)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, 'a', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    print(f"\nAppended {len(results)} results to {results_path}")
+    metrics.report()
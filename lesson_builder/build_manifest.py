@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Union
+
+def hash_bytes(data: bytes) -> str:
+    """SHA-256 hex digest of raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def canonical_json(obj: Any) -> str:
+    """Serialise an object the way hash_json does, so parts can be hashed together without re-serialising."""
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+def hash_json(obj: Any) -> str:
+    """Hash a JSON-serialisable object independently of dict ordering."""
+    return hash_bytes(canonical_json(obj).encode("utf-8"))
+
+def hash_file(path: Union[str, Path]) -> str:
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_files(paths: Iterable[Union[str, Path]]) -> str:
+    """Hash an ordered list of files by name and contents."""
+    return hash_json([[Path(p).name, hash_file(p)] for p in paths])
+
+class BuildManifest:
+    """
+    Records, for every generated artifact, a hash of the inputs it was built from.
+
+    Each pipeline stage asks is_stale(output, input_hash) before building and calls
+    record(output, input_hash) afterwards, so a run rebuilds exactly the artifacts
+    whose inputs changed. Outputs that exist but were never recorded (built before
+    the manifest existed) are adopted as up to date rather than rebuilt.
+
+    The manifest is a JSON file in the course directory, keyed by output path
+    relative to it. save() merges into the file on disk, so the three pipeline
+    scripts can share one manifest.
+    """
+    def __init__(self, base_dir: Union[str, Path], filename: str = ".build_manifest.json", adopt_untracked: bool = True):
+        self.base_dir = Path(base_dir)
+        self.path = self.base_dir / filename
+        self.adopt_untracked = adopt_untracked
+        self.entries: Dict[str, str] = self._read()
+        self._changed: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, str]:
+        if not self.path.exists():
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _key(self, output: Union[str, Path]) -> str:
+        output = Path(output)
+        try:
+            return output.resolve().relative_to(self.base_dir.resolve()).as_posix()
+        except ValueError:
+            return output.resolve().as_posix()
+
+    def is_stale(self, output: Union[str, Path], input_hash: str) -> bool:
+        """Return True if output is missing or was built from different inputs."""
+        if not Path(output).exists():
+            return True
+        key = self._key(output)
+        with self._lock:
+            recorded = self.entries.get(key)
+            if recorded is None and self.adopt_untracked:
+                self.entries[key] = self._changed[key] = input_hash
+                return False
+        return recorded != input_hash
+
+    def record(self, output: Union[str, Path], input_hash: str) -> None:
+        """Note that output has just been built from inputs hashing to input_hash."""
+        key = self._key(output)
+        with self._lock:
+            self.entries[key] = self._changed[key] = input_hash
+
+    def save(self) -> None:
+        """Merge this run's records into the manifest file and write it atomically."""
+        with self._lock:
+            if not self._changed:
+                return
+            self.base_dir.mkdir(parents=True, exist_ok=True)
+            merged = self._read()
+            merged.update(self._changed)
+            fd, tmp_path = tempfile.mkstemp(dir=self.base_dir, prefix=".build_manifest.", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(merged, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.entries = merged
+            self._changed = {}
@@ -0,0 +1,198 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+DEFAULT_CONTENT_CONFIG = "resources/lessons_content_config.json"
+INDEX_VERSION = 1
+
+_decoder = json.JSONDecoder()
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+def _expect(text: str, pos: int, char: str) -> int:
+    pos = _skip_whitespace(text, pos)
+    if pos >= len(text) or text[pos] != char:
+        raise ValueError(f"Expected {char!r} at character {pos}")
+    return pos + 1
+
+def scan_content_config(text: str) -> Tuple[Dict[str, Any], List[Tuple[Any, int, int]]]:
+    """
+    Walk a lessons content config once, decoding every top-level value except the
+    lessons, and locate each lesson without keeping it.
+
+    Args:
+        text: The config file contents
+
+    Returns:
+        Tuple[Dict[str, Any], List[Tuple[Any, int, int]]]: The top-level fields other
+            than lessons, and (lesson_number, start, end) character spans of the lessons
+    """
+    header: Dict[str, Any] = {}
+    spans: List[Tuple[Any, int, int]] = []
+    pos = _expect(text, 0, "{")
+    pos = _skip_whitespace(text, pos)
+    if text.startswith("}", pos):
+        return header, spans
+
+    while True:
+        pos = _skip_whitespace(text, pos)
+        key, pos = _decoder.raw_decode(text, pos)
+        pos = _expect(text, pos, ":")
+        pos = _skip_whitespace(text, pos)
+        if key == "lessons":
+            pos = _expect(text, pos, "[")
+            pos = _skip_whitespace(text, pos)
+            if text.startswith("]", pos):
+                pos += 1
+            else:
+                while True:
+                    pos = _skip_whitespace(text, pos)
+                    start = pos
+                    lesson, pos = _decoder.raw_decode(text, pos)
+                    spans.append((lesson["lesson_number"], start, pos))
+                    pos = _skip_whitespace(text, pos)
+                    if text.startswith("]", pos):
+                        pos += 1
+                        break
+                    pos = _expect(text, pos, ",")
+        else:
+            header[key], pos = _decoder.raw_decode(text, pos)
+        pos = _skip_whitespace(text, pos)
+        if text.startswith("}", pos):
+            return header, spans
+        pos = _expect(text, pos, ",")
+
+class ContentStore:
+    """
+    Lessons content config read one lesson at a time.
+
+    A sidecar index (<config>.index.json) holds the course fields and the byte range
+    of every lesson in the config. It is rebuilt whenever the config's size or
+    modification time changes, so the config stays the single file that is edited,
+    while opening the store and loading a lesson cost the same for any course size.
+    """
+    def __init__(self, path: Union[str, Path] = DEFAULT_CONTENT_CONFIG, index_path: Optional[Union[str, Path]] = None):
+        self.path = Path(path)
+        self.index_path = Path(index_path) if index_path else self.path.with_name(self.path.name + ".index.json")
+        self.header: Dict[str, Any] = {}
+        self.offsets: Dict[Any, Tuple[int, int]] = {}
+        self._load_index()
+
+    def _signature(self) -> Dict[str, int]:
+        stat = self.path.stat()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _load_index(self) -> None:
+        signature = self._signature()
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION and index.get("source") == signature:
+                self.header = index["header"]
+                self.offsets = {number: (start, end) for number, start, end in index["lessons"]}
+                return
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        self.rebuild_index(signature)
+
+    def rebuild_index(self, signature: Optional[Dict[str, int]] = None) -> None:
+        """Scan the config and rewrite the sidecar index."""
+        signature = signature or self._signature()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        text = data.decode('utf-8-sig')
+        header, spans = scan_content_config(text)
+
+        # Character spans to byte ranges, encoding each stretch of text once
+        bom = len(data) - len(text.encode('utf-8'))
+        lessons = []
+        char_pos, byte_pos = 0, bom
+        for number, start, end in spans:
+            byte_pos += len(text[char_pos:start].encode('utf-8'))
+            byte_start = byte_pos
+            byte_pos += len(text[start:end].encode('utf-8'))
+            char_pos = end
+            lessons.append([number, byte_start, byte_pos])
+
+        self.header = header
+        self.offsets = {number: (start, end) for number, start, end in lessons}
+
+        index = {"version": INDEX_VERSION, "source": signature, "header": header, "lessons": lessons}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.index_path.parent, prefix=f".{self.index_path.name}.", suffix=".tmp")
+        except OSError:
+            # Read-only checkout: the index only lives for this process
+            return
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def lesson_numbers(self) -> List[Any]:
+        """Lesson numbers in config order."""
+        return list(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, lesson_number: Any) -> bool:
+        return lesson_number in self.offsets
+
+    def unknown(self, lesson_numbers: Iterable[Any]) -> List[Any]:
+        """The given lesson numbers that are not in the config."""
+        return [number for number in lesson_numbers if number not in self.offsets]
+
+    def _read(self, f, lesson_number: Any) -> Dict[str, Any]:
+        start, end = self.offsets[lesson_number]
+        f.seek(start)
+        return json.loads(f.read(end - start))
+
+    def lesson(self, lesson_number: Any) -> Dict[str, Any]:
+        """
+        Load one lesson, reading only its bytes of the config.
+
+        Args:
+            lesson_number: Lesson to load (e.g. 1.1)
+
+        Returns:
+            Dict[str, Any]: The lesson, as it appears in the config
+        """
+        if lesson_number not in self.offsets:
+            raise KeyError(f"Lesson {lesson_number} not found in {self.path}")
+        with open(self.path, 'rb') as f:
+            return self._read(f, lesson_number)
+
+    def lessons(self, lesson_numbers: Optional[Iterable[Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Load the given lessons, or every lesson, one at a time through one open file.
+        Unknown lesson numbers raise KeyError before any lesson is read.
+        """
+        numbers = list(self.offsets if lesson_numbers is None else lesson_numbers)
+        unknown = self.unknown(numbers)
+        if unknown:
+            raise KeyError(f"Lessons {', '.join(map(str, unknown))} not found in {self.path}")
+        with open(self.path, 'rb') as f:
+            for number in numbers:
+                yield self._read(f, number)
+
+    def config(self, lesson_numbers: Optional[Iterable[Any]] = None) -> Dict[str, Any]:
+        """
+        A content config holding only the given lessons.
+
+        Args:
+            lesson_numbers: Lessons to include; every lesson when None
+
+        Returns:
+            Dict[str, Any]: The course fields with the selected lessons, in the
+                shape of lessons_content_config.json
+        """
+        return {**self.header, "lessons": list(self.lessons(lesson_numbers))}
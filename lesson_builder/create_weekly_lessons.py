@@ -1,41 +1,149 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, FrozenSet, NamedTuple
+from build_manifest import BuildManifest, canonical_json, hash_bytes
+from content_store import DEFAULT_CONTENT_CONFIG, ContentStore
+from metrics import metrics
 
-def load_configs() -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    """Load both configuration files."""
-    with open('resources/lessons_content_config.json', 'r', encoding='utf-8') as f:
-        content_config = json.load(f)
+DEFAULT_STRUCTURE_CONFIG = "resources/weekly_structure_config.json"
+
+def load_configs(
+    content_path: str = DEFAULT_CONTENT_CONFIG,
+    structure_path: str = DEFAULT_STRUCTURE_CONFIG,
+    lesson_numbers: Optional[List[float]] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Load both configuration files.
     
-    with open('resources/weekly_structure_config.json', 'r', encoding='utf-8') as f:
+    Args:
+        content_path: Path to the lessons content config
+        structure_path: Path to the weekly structure config
+        lesson_numbers: Lessons to load (e.g. [1.1, 2.3]); every lesson when None.
+            Lessons are read individually through the content store's index
+    
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, Any]]: Content config holding the selected
+            lessons, and the structure config
+    """
+    content_config = ContentStore(content_path).config(lesson_numbers)
+    
+    with open(structure_path, 'r', encoding='utf-8') as f:
         structure_config = json.load(f)
     
     return content_config, structure_config
 
-def get_phrases_by_indices(phrases: List[Dict[str, Any]], indices: List[int]) -> List[Dict[str, Any]]:
-    """Get phrases by their 1-based indices, including their modifications."""
-    result = []
-    for i in indices:
-        # Get the base phrase (index is 1-based)
-        phrase = phrases[i-1].copy()
-        
-        # If there are modifications, include them
-        if "modifications" in phrase:
-            phrase["modifications"] = phrase["modifications"]
-        
-        result.append(phrase)
-    return result
+class DaySlice(NamedTuple):
+    """One day of the weekly structure, resolved once for every lesson"""
+    filename: str
+    structure: Dict[str, Any]
+    recap_indices: List[int]                       # 0-based
+    target_indices: List[int]                      # 0-based
+    modification_types: Optional[FrozenSet[str]]   # None keeps every modification
+    structure_json: str                            # canonical JSON, for input hashes
+
+def index_week(structure_config: Dict[str, Any]) -> List[DaySlice]:
+    """Resolve the weekly structure into per-day phrase slices."""
+    days = []
+    for i, daily_lesson in enumerate(structure_config["lessons"], 1):
+        types = daily_lesson.get("modification_types")
+        days.append(DaySlice(
+            filename=f"{i:02d}_{daily_lesson['day'].lower()}.json",
+            structure=daily_lesson,
+            recap_indices=[n - 1 for n in daily_lesson["recap_phrases"]],
+            target_indices=[n - 1 for n in daily_lesson["target_phrases"]],
+            modification_types=frozenset(types) if types is not None else None,
+            structure_json=canonical_json(daily_lesson)
+        ))
+    return days
+
+class PhraseIndex:
+    """
+    A lesson's phrases with their modifications grouped by type.
+    
+    Phrases are shared, not copied, between the days that use them. A phrase whose
+    modifications are narrowed to a day's types is built once per distinct set of types.
+    """
+    def __init__(self, phrases: List[Dict[str, Any]]):
+        self.phrases = phrases
+        self.mod_types = [
+            {mod["type"] for mod in phrase["modifications"]} if "modifications" in phrase else None
+            for phrase in phrases
+        ]
+        self._filtered: Dict[Tuple[int, FrozenSet[str]], Dict[str, Any]] = {}
+    
+    def get(self, indices: List[int]) -> List[Dict[str, Any]]:
+        """The phrases at the given 0-based indices, including their modifications."""
+        phrases = self.phrases
+        return [phrases[i] for i in indices]
+    
+    def get_filtered(self, indices: List[int], types: FrozenSet[str]) -> List[Dict[str, Any]]:
+        """The phrases at the given indices, keeping only modifications of the given types."""
+        result = []
+        for i in indices:
+            mod_types = self.mod_types[i]
+            if mod_types is None or mod_types <= types:
+                # Nothing to filter out: share the phrase itself
+                result.append(self.phrases[i])
+                continue
+            key = (i, types)
+            if key not in self._filtered:
+                phrase = self.phrases[i]
+                self._filtered[key] = {
+                    **phrase,
+                    "modifications": [mod for mod in phrase["modifications"] if mod["type"] in types]
+                }
+            result.append(self._filtered[key])
+        return result
 
 def parse_lesson_number(lesson_number: float) -> Tuple[int, int]:
     """Convert lesson number (e.g., 1.1) to part and lesson numbers."""
     part_num, lesson_num = str(lesson_number).split('.')
     return int(part_num), int(lesson_num)
 
+def build_daily_plan(lesson: Dict[str, Any], phrases: PhraseIndex, day: DaySlice) -> Dict[str, Any]:
+    """Assemble one day's plan for a lesson."""
+    daily_lesson = day.structure
+    
+    # Get specific phrases for this day with modifications, filtered by type if specified
+    if day.modification_types is not None:
+        target_phrases = phrases.get_filtered(day.target_indices, day.modification_types)
+    else:
+        target_phrases = phrases.get(day.target_indices)
+    recap_phrases = phrases.get(day.recap_indices)
+    
+    # Create the daily lesson plan
+    daily_plan = {
+        "lesson_number": lesson["lesson_number"],
+        "title": lesson["title"],
+        "day": daily_lesson["day"],
+        "recap_phrases": recap_phrases,
+        "target_phrases": target_phrases,
+        "lesson_structure": daily_lesson["lesson_structure"]
+    }
+    
+    # Add modification focus if present in the daily structure
+    if "modification_focus" in daily_lesson:
+        daily_plan["modification_focus"] = daily_lesson["modification_focus"]
+    return daily_plan
+
+def write_plan(filepath: Path, daily_plan: Dict[str, Any], compact: bool = False) -> None:
+    with open(filepath, 'w', encoding='utf-8') as f:
+        if compact:
+            json.dump(daily_plan, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            json.dump(daily_plan, f, ensure_ascii=False, indent=2)
+
+@metrics.traced("plans.generate")
 def generate_daily_lesson_plans(
-    content_config: Dict[str, Any], 
-    structure_config: Dict[str, Any], 
-    base_dir: str = "danish"
-) -> None:
+    content_config: Dict[str, Any],
+    structure_config: Dict[str, Any],
+    base_dir: str = "danish",
+    manifest: Optional[BuildManifest] = None,
+    compact: bool = False,
+    workers: int = 8,
+    verbose: bool = False
+) -> int:
     """
     Generates daily lesson plans for each lesson in the course.
     
@@ -43,74 +151,99 @@ def generate_daily_lesson_plans(
         content_config: Dictionary containing course and lesson content
         structure_config: Dictionary containing the weekly lesson structure
         base_dir: Base directory for lessons
+        manifest: Build manifest; plans whose lesson content and day structure are
+            unchanged since they were written are left untouched
+        compact: Write plans without indentation
+        workers: Number of threads serialising and writing plans
+        verbose: Print every plan written instead of a summary
+    
+    Returns:
+        int: Number of plans written
     """
     base_path = Path(base_dir)
+    days = index_week(structure_config)
     
-    # Process each lesson
-    for lesson in content_config["lessons"]:
-        lesson_number = lesson["lesson_number"]
-        part_num, lesson_num = parse_lesson_number(lesson_number)
-        title = lesson["title"]
-        all_phrases = lesson["target_phrases"]
-        
-        # Create lesson directory path with new structure
-        lesson_dir = (base_path / 
-                     f"part_{part_num:02d}" / 
-                     f"lesson_{lesson_num:02d}" /
-                     "daily_plans")
-        
-        # Create directories
-        lesson_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Process each day's lesson
-        for i, daily_lesson in enumerate(structure_config["lessons"], 1):
-            day = daily_lesson["day"].lower()
-            
-            # Get specific phrases for this day with modifications
-            target_phrases = get_phrases_by_indices(all_phrases, daily_lesson["target_phrases"])
-            recap_phrases = get_phrases_by_indices(all_phrases, daily_lesson["recap_phrases"])
-            
-            # Organize modifications by type if specified in the structure config
-            if "modification_types" in daily_lesson:
-                for phrase in target_phrases:
-                    if "modifications" in phrase:
-                        # Filter modifications based on the specified types
-                        filtered_mods = [
-                            mod for mod in phrase["modifications"] 
-                            if mod["type"] in daily_lesson["modification_types"]
-                        ]
-                        phrase["modifications"] = filtered_mods
-            
-            # Create the daily lesson plan
-            daily_plan = {
-                "lesson_number": lesson_number,
-                "title": title,
-                "day": daily_lesson["day"],
-                "recap_phrases": recap_phrases,
-                "target_phrases": target_phrases,
-                "lesson_structure": daily_lesson["lesson_structure"]
-            }
+    def save(job: Tuple[Path, Dict[str, Any], str]) -> None:
+        filepath, daily_plan, input_hash = job
+        write_plan(filepath, daily_plan, compact)
+        if manifest is not None:
+            manifest.record(filepath, input_hash)
+        if verbose:
+            print(f"Generated {filepath}")
+    
+    futures = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Process each lesson
+        for lesson in content_config["lessons"]:
+            part_num, lesson_num = parse_lesson_number(lesson["lesson_number"])
+            phrases = PhraseIndex(lesson["target_phrases"])
+            lesson_json = canonical_json(lesson)
             
-            # Add modification focus if present in the daily structure
-            if "modification_focus" in daily_lesson:
-                daily_plan["modification_focus"] = daily_lesson["modification_focus"]
+            # Create lesson directory path with new structure
+            lesson_dir = (base_path /
+                         f"part_{part_num:02d}" /
+                         f"lesson_{lesson_num:02d}" /
+                         "daily_plans")
             
-            # Save to file with new naming convention
-            filepath = lesson_dir / f"{i:02d}_{day}.json"
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(daily_plan, f, ensure_ascii=False, indent=2)
+            # Create directories
+            lesson_dir.mkdir(parents=True, exist_ok=True)
             
-            print(f"Generated {day} plan for Part {part_num}, Lesson {lesson_num}")
-            print(f"  → Saved to: {filepath}")
+            for day in days:
+                filepath = lesson_dir / day.filename
+                
+                # A plan depends only on its lesson's content and its day's structure
+                # (the same digest as hash_json([lesson, daily_lesson]), without re-serialising)
+                input_hash = hash_bytes(f"[{lesson_json},{day.structure_json}]".encode("utf-8"))
+                if manifest is not None and not manifest.is_stale(filepath, input_hash):
+                    continue
+                
+                # Serialise and write in parallel with building the next plans
+                futures.append(executor.submit(save, (filepath, build_daily_plan(lesson, phrases, day), input_hash)))
+        
+        for future in futures:
+            future.result()
+    
+    print(f"Wrote {len(futures)} daily plans for {len(content_config['lessons'])} lessons to {base_path}")
+    metrics.annotate(lessons=len(content_config["lessons"]), plans=len(futures))
+    return len(futures)
 
 def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate daily lesson plans from the course content and weekly structure')
+    parser.add_argument('--compact', action='store_true', help='Write plans without indentation')
+    parser.add_argument('--workers', type=int, default=8, help='Threads writing plans')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan written')
+    parser.add_argument('--lesson', type=float, action='append', help='Only generate this lesson (e.g. 1.1); repeat for several')
+    parser.add_argument('--content', default=DEFAULT_CONTENT_CONFIG, help='Lessons content config')
+    parser.add_argument('--structure', default=DEFAULT_STRUCTURE_CONFIG, help='Weekly structure config')
+    parser.add_argument('--base-dir', default='danish', help='Base directory for lessons')
+    parser.add_argument('--no-manifest', action='store_true', help='Rewrite every plan, ignoring whether its inputs changed')
+    parser.add_argument('--metrics', help='Append timings to this JSONL file and print a summary')
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.configure(args.metrics)
+    
+    if args.lesson:
+        store = ContentStore(args.content)
+        unknown = store.unknown(args.lesson)
+        if unknown:
+            parser.error(f"no lesson {', '.join(map(str, unknown))} in {args.content}; "
+                         f"valid lessons: {', '.join(map(str, store.lesson_numbers()))}")
+    
     # Load both config files
-    content_config, structure_config = load_configs()
+    content_config, structure_config = load_configs(args.content, args.structure, args.lesson)
     
-    # Generate daily plans
-    generate_daily_lesson_plans(content_config, structure_config)
+    # Generate daily plans, rewriting only those whose inputs changed. Plans cost
+    # nothing to rebuild, so ones written before the manifest are not trusted.
+    manifest = None if args.no_manifest else BuildManifest(args.base_dir, adopt_untracked=False)
+    generate_daily_lesson_plans(content_config, structure_config, base_dir=args.base_dir, manifest=manifest,
+                                compact=args.compact, workers=args.workers, verbose=args.verbose)
+    if manifest is not None:
+        manifest.save()
     
     print("\nDaily lesson plans generated successfully!")
+    metrics.report()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,71 +1,125 @@
 import anthropic
+import httpx
 import json
 import os
-from typing import Dict, Any
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
 from pathlib import Path
 from prompt_manager import PromptManager
+from rate_limiter import RateLimiter, estimate_tokens, is_retryable_status
+from response_cache import ResponseCache
+from build_manifest import BuildManifest, hash_json
+from metrics import metrics
 
-def create_danish_lesson(lesson_data: Dict[str, Any], prompt_type: str, prompt_manager: PromptManager, test_mode: bool = False) -> str:
+MODEL = "claude-3-5-sonnet-20241022"
+MAX_TOKENS = 4000
+
+_shared_clients: Dict[bool, anthropic.Anthropic] = {}
+_shared_prompt_managers: Dict[str, PromptManager] = {}
+_shared_lock = threading.Lock()
+
+@dataclass
+class ActivityJob:
+    lesson_data: Dict[str, Any]
+    activity_type: str
+    filepath: Path
+    input_hash: Optional[str] = None  # Hash of the request the transcript is built from
+
+class UsageStats:
+    """Thread-safe tally of token usage per activity type, split by prompt cache status."""
+    FIELDS = ("requests", "input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens")
+
+    def __init__(self):
+        self.by_type: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, prompt_type: str, usage: Any) -> None:
+        """Add the usage block of one Claude response."""
+        with self._lock:
+            totals = self.by_type.setdefault(prompt_type, dict.fromkeys(self.FIELDS, 0))
+            totals["requests"] += 1
+            for field in self.FIELDS[1:]:
+                totals[field] += getattr(usage, field, None) or 0
+
+    def totals(self) -> Dict[str, int]:
+        """Usage summed over all activity types."""
+        with self._lock:
+            return {
+                field: sum(t[field] for t in self.by_type.values())
+                for field in self.FIELDS
+            }
+
+    def report(self) -> None:
+        """Print cached vs. uncached input tokens per activity type and for the whole run."""
+        if not self.by_type:
+            return
+        print("\nToken usage (input = uncached / cache write / cache read):")
+        rows = sorted(self.by_type.items()) + [("TOTAL", self.totals())]
+        for prompt_type, t in rows:
+            all_input = t["input_tokens"] + t["cache_creation_input_tokens"] + t["cache_read_input_tokens"]
+            hit_ratio = t["cache_read_input_tokens"] / all_input if all_input else 0.0
+            print(f"  {prompt_type:<20} {t['requests']:>4} requests  "
+                  f"input {t['input_tokens']:>8} / {t['cache_creation_input_tokens']:>8} / "
+                  f"{t['cache_read_input_tokens']:>8}  ({hit_ratio:.0%} cached)  "
+                  f"output {t['output_tokens']:>8}")
+
+def filter_lesson_data(lesson_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Filter lesson data to include only the fields sent to Claude."""
+    return {
+        "title": lesson_data["title"],
+        "recap_phrases": lesson_data["recap_phrases"],
+        "target_phrases": lesson_data["target_phrases"]
+    }
+
+def build_message_params(lesson_data: Dict[str, Any], prompt_type: str, prompt_manager: PromptManager) -> Dict[str, Any]:
     """
-    Creates a Danish lesson using Claude API.
+    Build the Messages API parameters for one lesson activity.
     
     Args:
         lesson_data: Dictionary containing lesson data including day, title, and phrases
         prompt_type: Type of prompt to use
         prompt_manager: Instance of PromptManager
-    """
-    # Filter lesson data to include only necessary fields
-    filtered_data = {
-        "title": lesson_data["title"],
-        "recap_phrases": lesson_data["recap_phrases"],
-        "target_phrases": lesson_data["target_phrases"]
-    }
     
-    client = anthropic.Anthropic(
-        api_key=os.getenv("ANTHROPIC_API_KEY"),
-    )
-    
-    # Get formatted prompt and examples
+    Returns:
+        Keyword arguments for client.messages.create, also usable as batch request params
+    """
     system_prompt, examples = prompt_manager.format_for_claude(prompt_type)
     
-    # If in test mode, return debug content
-    if test_mode:
-        print(f"TEST MODE: Skipping API call for {prompt_type}")
-        debug_output = [
-            "=== System Prompt ===",
-            system_prompt,
-            "\n=== Examples ===",
-            examples,
-            "\n=== Input Data ===",
-            json.dumps(filtered_data, ensure_ascii=False, indent=2)
-        ]
-        return "\n".join(debug_output)
-    
-    # Create the complete message content
+    # Create the complete message content. The system prompt and examples are identical
+    # for every request of this prompt type, so the cache breakpoint goes after the examples:
+    # the whole static prefix is cached and only the lesson data is processed afresh.
+    # (The system prompt alone is below the minimum cacheable length.)
     message_content = [
         {
             "type": "text",
-            "text": examples
+            "text": examples,
+            "cache_control": {"type": "ephemeral"}
         },
         {
             "type": "text",
-            "text": json.dumps(filtered_data, ensure_ascii=False, indent=2)
+            "text": json.dumps(filter_lesson_data(lesson_data), ensure_ascii=False, indent=2)
         }
     ]
-
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=4000,
-        temperature=0,
-        system=system_prompt,
-        messages=[
+    
+    return {
+        "model": MODEL,
+        "max_tokens": MAX_TOKENS,
+        "temperature": 0,
+        "system": system_prompt,
+        "messages": [
             {
                 "role": "user",
                 "content": message_content
             }
         ]
-    )
-    
+    }
+
+def extract_text(message: Any) -> str:
+    """Return the text of the first content block of a Claude response."""
     if isinstance(message.content, list) and len(message.content) > 0:
         first_content = message.content[0]
         if hasattr(first_content, 'text'):
@@ -75,24 +129,185 @@ def create_danish_lesson(lesson_data: Dict[str, Any], prompt_type: str, prompt_m
     
     raise ValueError("Unexpected response format from Claude")
 
-def process_daily_plan(
+def record_usage(span: Dict[str, Any], usage: Any) -> None:
+    """Add a response's token usage to a metrics span's fields and the run's token counters."""
+    metrics.count("claude.requests")
+    for field in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+        tokens = getattr(usage, field, None) or 0
+        span[field] = tokens
+        metrics.count(f"claude.{field}", tokens)
+
+def create_danish_lesson(
+    lesson_data: Dict[str, Any],
+    prompt_type: str,
+    prompt_manager: PromptManager,
+    test_mode: bool = False,
+    client: Optional[anthropic.Anthropic] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    usage_stats: Optional[UsageStats] = None,
+    response_cache: Optional[ResponseCache] = None
+) -> str:
+    """
+    Creates a Danish lesson using Claude API.
+    
+    Args:
+        lesson_data: Dictionary containing lesson data including day, title, and phrases
+        prompt_type: Type of prompt to use
+        prompt_manager: Instance of PromptManager
+        client: Anthropic client. The process-wide shared client is used if not provided
+        rate_limiter: Shared RateLimiter pacing and retrying the API call
+        usage_stats: Collects token usage, including prompt cache reads and writes
+        response_cache: Local cache answering requests whose inputs have not changed
+    """
+    # If in test mode, return debug content
+    if test_mode:
+        system_prompt, examples = prompt_manager.format_for_claude(prompt_type)
+        print(f"TEST MODE: Skipping API call for {prompt_type}")
+        debug_output = [
+            "=== System Prompt ===",
+            system_prompt,
+            "\n=== Examples ===",
+            examples,
+            "\n=== Input Data ===",
+            json.dumps(filter_lesson_data(lesson_data), ensure_ascii=False, indent=2)
+        ]
+        return "\n".join(debug_output)
+    
+    with metrics.span("claude.create_lesson", prompt_type=prompt_type) as span:
+        params = build_message_params(lesson_data, prompt_type, prompt_manager)
+        
+        cache_key = None
+        if response_cache is not None:
+            cache_key = ResponseCache.make_key(params)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                print(f"  Using cached response for {prompt_type}")
+                metrics.count("claude.response_cache.hits")
+                span["cached"] = True
+                return cached
+            metrics.count("claude.response_cache.misses")
+        
+        if client is None:
+            client = get_client(rate_limiter)
+
+        def send():
+            with metrics.timer("claude.request"):
+                return client.messages.create(**params)
+
+        if rate_limiter is None:
+            message = send()
+        else:
+            estimated_input = estimate_tokens(
+                params["system"], *(block["text"] for block in params["messages"][0]["content"])
+            )
+            message = rate_limiter.call(send, estimated_input, MAX_TOKENS)
+            rate_limiter.settle(
+                estimated_input, MAX_TOKENS,
+                # Cache reads do not count towards the input token rate limit
+                message.usage.input_tokens + (message.usage.cache_creation_input_tokens or 0),
+                message.usage.output_tokens
+            )
+        
+        if usage_stats is not None:
+            usage_stats.record(prompt_type, message.usage)
+        record_usage(span, message.usage)
+        
+        text = extract_text(message)
+        if response_cache is not None:
+            response_cache.put(cache_key, text)
+        return text
+
+def write_atomic(filepath: Path, content: str) -> None:
+    """Write content to a temporary file next to filepath and rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """Retry rate limits, overload and server errors, plus dropped connections and timeouts."""
+    return is_retryable_status(exc) or isinstance(exc, anthropic.APIConnectionError)
+
+def create_client(
+    rate_limiter: Optional[RateLimiter] = None,
+    max_connections: int = 20,
+    base_url: Optional[str] = None
+) -> anthropic.Anthropic:
+    """
+    Create an Anthropic client with a keep-alive connection pool.
+    When a RateLimiter owns retries, the SDK's own retries are disabled.
+    
+    Args:
+        rate_limiter: RateLimiter that will wrap calls made with this client
+        max_connections: Size of the HTTP connection pool, at least the number of workers
+        base_url: API endpoint, e.g. a local stub server. Defaults to ANTHROPIC_BASE_URL or the public API
+    """
+    return anthropic.Anthropic(
+        api_key=os.getenv("ANTHROPIC_API_KEY"),
+        base_url=base_url,
+        max_retries=0 if rate_limiter is not None else 2,
+        http_client=anthropic.DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                # Keep idle connections open across rate-limiter waits
+                keepalive_expiry=120
+            )
+        ),
+    )
+
+def get_client(rate_limiter: Optional[RateLimiter] = None) -> anthropic.Anthropic:
+    """Return the process-wide Anthropic client, creating it on first use."""
+    owns_retries = rate_limiter is not None
+    with _shared_lock:
+        if owns_retries not in _shared_clients:
+            _shared_clients[owns_retries] = create_client(rate_limiter)
+        return _shared_clients[owns_retries]
+
+def get_prompt_manager(prompts_dir: str = "lesson_builder/prompts") -> PromptManager:
+    """Return the process-wide PromptManager for prompts_dir, loading the prompts on first use."""
+    key = str(Path(prompts_dir).resolve())
+    with _shared_lock:
+        if key not in _shared_prompt_managers:
+            _shared_prompt_managers[key] = PromptManager(prompts_dir)
+        return _shared_prompt_managers[key]
+
+def collect_activity_jobs(
     plan_file: Path,
-    prompts_dir: str = "lesson_builder/prompts",
-    test_mode: bool = False
-) -> None:
+    force: bool = False,
+    manifest: Optional[BuildManifest] = None,
+    prompt_manager: Optional[PromptManager] = None
+) -> List[ActivityJob]:
     """
-    Process a single daily plan file and generate outputs for each activity type.
-    Skip files that already exist instead of overwriting them.
+    Build the list of activities in a daily plan that still need a transcript.
+    Activities whose output file already exists are skipped. With a manifest,
+    existing transcripts are only skipped if their request (lesson data, prompt
+    and examples, model settings) is unchanged since they were built.
+    With prompts, each request is built here, so an unreadable plan or an
+    activity whose request cannot be built is reported and skipped.
     
     Args:
         plan_file: Path to the daily plan JSON file
-        prompts_dir: Directory containing prompt configurations
-    """
-    prompt_manager = PromptManager(prompts_dir)
+        force: Include activities whose output file already exists
+        manifest: Build manifest used to detect stale transcripts
+        prompt_manager: Loaded prompts, required with a manifest
     
+    Returns:
+        List of jobs, one per missing transcript
+    """
     # Load lesson data
-    with open(plan_file, 'r', encoding='utf-8') as f:
-        lesson_data = json.load(f)
+    try:
+        with open(plan_file, 'r', encoding='utf-8') as f:
+            lesson_data = json.load(f)
+        lesson_structure = lesson_data['lesson_structure']
+    except Exception as e:
+        print(f"  Error reading {plan_file.name}: {str(e)}")
+        return []
     
     # Determine paths based on the plan file location
     lesson_dir = plan_file.parent.parent  # Go up from daily_plans to lesson_01
@@ -102,46 +317,330 @@ def process_daily_plan(
     # Get day from filename (e.g., "tuesday" from "tuesday_02.json")
     day = plan_file.stem.split('_')[0].lower()
     
-    # Process each activity type in the lesson structure
-    for idx, activity_type in enumerate(lesson_data['lesson_structure'], 1):
-        try:
-            # Create filename using the day and activity
-            filename = f"{day}_{idx:02d}_{activity_type}.csv"
-            filepath = transcripts_dir / filename
-            
-            # Skip if file already exists
-            if filepath.exists():
-                print(f"  Skipping {filename} - file already exists")
+    jobs = []
+    for idx, activity_type in enumerate(lesson_structure, 1):
+        # Create filename using the day and activity
+        filename = f"{day}_{idx:02d}_{activity_type}.csv"
+        filepath = transcripts_dir / filename
+        
+        params = None
+        if prompt_manager is not None:
+            try:
+                params = build_message_params(lesson_data, activity_type, prompt_manager)
+            except Exception as e:
+                print(f"  Error processing {activity_type}: {str(e)}")
                 continue
-                
-            print(f"  Generating {activity_type} version...")
-            csv_content = create_danish_lesson(lesson_data, activity_type, prompt_manager, test_mode=test_mode)
-            
-            # Write new content
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(csv_content)
-                
-            print(f"  Successfully generated {filename}")
-            
-        except Exception as e:
-            print(f"  Error processing {activity_type} version: {str(e)}")
+        
+        input_hash = None
+        if manifest is not None:
+            input_hash = hash_json(params)
+            if not force and not manifest.is_stale(filepath, input_hash):
+                print(f"  Skipping {filename} - up to date")
+                continue
+        
+        # Skip if file already exists
+        elif filepath.exists() and not force:
+            print(f"  Skipping {filename} - file already exists")
             continue
+        
+        jobs.append(ActivityJob(lesson_data, activity_type, filepath, input_hash))
+    
+    return jobs
+
+def run_activity_job(
+    job: ActivityJob,
+    prompt_manager: PromptManager,
+    test_mode: bool = False,
+    client: Optional[anthropic.Anthropic] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    usage_stats: Optional[UsageStats] = None,
+    response_cache: Optional[ResponseCache] = None,
+    manifest: Optional[BuildManifest] = None
+) -> bool:
+    """
+    Generate the transcript for a single activity and write it atomically.
+    The transcript is recorded in the manifest, if given, once written.
+    
+    Returns:
+        bool: True if the transcript was written, False otherwise
+    """
+    try:
+        print(f"  Generating {job.activity_type} version...")
+        csv_content = create_danish_lesson(
+            job.lesson_data, job.activity_type, prompt_manager,
+            test_mode=test_mode, client=client, rate_limiter=rate_limiter,
+            usage_stats=usage_stats, response_cache=response_cache
+        )
+        write_atomic(job.filepath, csv_content)
+        if manifest is not None and job.input_hash is not None:
+            manifest.record(job.filepath, job.input_hash)
+        print(f"  Successfully generated {job.filepath.name}")
+        return True
+        
+    except Exception as e:
+        print(f"  Error processing {job.activity_type} version for {job.filepath.name}: {str(e)}")
+        return False
 
-def process_lesson_plans(base_dir: str = "danish", test_mode: bool = False) -> None:
+def process_daily_plan(
+    plan_file: Path,
+    prompts_dir: str = "lesson_builder/prompts",
+    test_mode: bool = False,
+    client: Optional[anthropic.Anthropic] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    prompt_manager: Optional[PromptManager] = None,
+    usage_stats: Optional[UsageStats] = None,
+    response_cache: Optional[ResponseCache] = None
+) -> None:
+    """
+    Process a single daily plan file and generate outputs for each activity type.
+    Skip files that already exist instead of overwriting them.
+    
+    Args:
+        plan_file: Path to the daily plan JSON file
+        prompts_dir: Directory containing prompt configurations
+        client: Anthropic client. The process-wide shared client is used if not provided
+        rate_limiter: Shared RateLimiter pacing and retrying API calls
+        prompt_manager: Loaded prompts. The process-wide PromptManager for prompts_dir is used if not provided
+        usage_stats: Collects token usage across calls
+        response_cache: Local cache answering requests whose inputs have not changed
+    """
+    if prompt_manager is None:
+        prompt_manager = get_prompt_manager(prompts_dir)
+    
+    # Process each activity type in the lesson structure
+    for job in collect_activity_jobs(plan_file):
+        run_activity_job(
+            job, prompt_manager, test_mode=test_mode, client=client,
+            rate_limiter=rate_limiter, usage_stats=usage_stats, response_cache=response_cache
+        )
+
+def group_jobs_by_activity(jobs: List[ActivityJob]) -> Dict[str, List[ActivityJob]]:
+    """Group jobs by activity type, keeping plan order within each group."""
+    groups: Dict[str, List[ActivityJob]] = {}
+    for job in jobs:
+        groups.setdefault(job.activity_type, []).append(job)
+    return groups
+
+def collect_all_jobs(
+    base_path: Path,
+    force: bool = False,
+    manifest: Optional[BuildManifest] = None,
+    prompt_manager: Optional[PromptManager] = None
+) -> List[ActivityJob]:
+    """Collect the missing or stale transcripts of every daily plan under base_path, grouped by activity type."""
+    jobs = []
+    for plan_file in sorted(base_path.glob("**/daily_plans/*.json")):
+        print(f"\nCollecting activities from: {plan_file.relative_to(base_path)}")
+        jobs.extend(collect_activity_jobs(plan_file, force=force, manifest=manifest, prompt_manager=prompt_manager))
+    return [job for group in group_jobs_by_activity(jobs).values() for job in group]
+
+def process_lesson_plans(
+    base_dir: str = "danish",
+    test_mode: bool = False,
+    max_workers: int = 1,
+    rate_limiter: Optional[RateLimiter] = None,
+    base_url: Optional[str] = None,
+    response_cache: Optional[ResponseCache] = None,
+    force: bool = False,
+    manifest: Optional[BuildManifest] = None
+) -> None:
     """
     Process all daily plan files in the Danish course structure.
     
+    Missing transcripts are generated grouped by activity type so that consecutive
+    requests share a cached system prompt and examples prefix.
+    
     Args:
         base_dir: Base directory for the Danish course
+        max_workers: Number of concurrent Claude requests
+        rate_limiter: Paces requests against the account's per-minute budgets and retries
+            rate-limited calls. A default-budget limiter is used if not provided
+        base_url: API endpoint override, e.g. a local stub server
+        response_cache: Local cache answering requests whose inputs have not changed
+        force: Regenerate transcripts that already exist (unchanged ones come from the cache)
+        manifest: Build manifest; existing transcripts are regenerated when their inputs changed
     """
     base_path = Path(base_dir)
     
-    # Find all daily plan JSON files
-    plan_files = base_path.glob("**/daily_plans/*.json")
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(is_retryable=is_retryable_error)
+    
+    # One client and one set of parsed prompts serve the whole run
+    client = None
+    if not test_mode:
+        client = create_client(rate_limiter, max_connections=max(max_workers, 1), base_url=base_url)
+    prompt_manager = get_prompt_manager()
+    usage_stats = UsageStats()
+    
+    # Collect every missing transcript up front so the pool stays busy across plan files
+    jobs = collect_all_jobs(base_path, force=force, manifest=manifest, prompt_manager=prompt_manager)
+    
+    groups = group_jobs_by_activity(jobs)
+    print(f"\nGenerating {len(jobs)} transcripts across {len(groups)} activity types "
+          f"with {max_workers} workers...")
+    
+    def run(job: ActivityJob) -> bool:
+        return run_activity_job(
+            job, prompt_manager, test_mode, client, rate_limiter, usage_stats, response_cache, manifest
+        )
     
-    for plan_file in sorted(plan_files):
-        print(f"\nProcessing daily plan: {plan_file.relative_to(base_path)}")
-        process_daily_plan(plan_file, test_mode=test_mode)
+    failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            # Send one request per activity type first so that each prompt prefix is
+            # written to the cache before the rest of its group is sent
+            warmups = [group[0] for group in groups.values()]
+            remaining = [job for group in groups.values() for job in group[1:]]
+            for batch in (warmups, remaining):
+                futures = [executor.submit(run, job) for job in batch]
+                for future in as_completed(futures):
+                    if not future.result():
+                        failed += 1
+    finally:
+        if manifest is not None:
+            manifest.save()
+    
+    print(f"\nFinished: {len(jobs) - failed} generated, {failed} failed")
+    usage_stats.report()
+    if response_cache is not None:
+        response_cache.report()
+
+def submit_batch(
+    client: anthropic.Anthropic,
+    jobs: List[ActivityJob],
+    prompt_manager: PromptManager,
+    state_file: Path
+) -> str:
+    """
+    Submit every job as one Message Batch and record the batch in state_file,
+    so an interrupted run can pick up the results later.
+    
+    Returns:
+        The batch id
+    """
+    pending = {
+        f"job-{i:05d}": (job, build_message_params(job.lesson_data, job.activity_type, prompt_manager))
+        for i, job in enumerate(jobs)
+    }
+    batch = client.messages.batches.create(
+        requests=[
+            {"custom_id": custom_id, "params": params}
+            for custom_id, (job, params) in pending.items()
+        ]
+    )
+    state = {
+        "batch_id": batch.id,
+        "jobs": {
+            custom_id: {
+                "activity_type": job.activity_type,
+                "filepath": str(job.filepath),
+                "cache_key": ResponseCache.make_key(params)
+            }
+            for custom_id, (job, params) in pending.items()
+        }
+    }
+    write_atomic(state_file, json.dumps(state, indent=2))
+    print(f"Submitted batch {batch.id} with {len(pending)} requests")
+    return batch.id
+
+def process_lesson_plans_batch(
+    base_dir: str = "danish",
+    poll_interval: float = 60.0,
+    base_url: Optional[str] = None,
+    response_cache: Optional[ResponseCache] = None,
+    force: bool = False,
+    manifest: Optional[BuildManifest] = None
+) -> None:
+    """
+    Generate every missing or stale transcript through the Message Batches API.
+    
+    All missing (plan file, activity) pairs are submitted as one batch, which is
+    polled until it ends; each result is then written to its transcript path.
+    The pending batch is recorded in <base_dir>/.pending_batch.json, and a later
+    run resumes it instead of submitting a new one.
+    
+    Args:
+        base_dir: Base directory for the Danish course
+        poll_interval: Seconds between batch status checks
+        base_url: API endpoint override, e.g. a local stub server
+        response_cache: Local cache; hits are written directly and never submitted
+        force: Regenerate transcripts that already exist (unchanged ones come from the cache)
+        manifest: Build manifest; existing transcripts are regenerated when their inputs changed
+    """
+    base_path = Path(base_dir)
+    state_file = base_path / ".pending_batch.json"
+    client = create_client(base_url=base_url)
+    prompt_manager = get_prompt_manager()
+    
+    if state_file.exists():
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        batch_id = state["batch_id"]
+        print(f"Resuming batch {batch_id}")
+    else:
+        jobs = collect_all_jobs(base_path, force=force, manifest=manifest, prompt_manager=prompt_manager)
+        if response_cache is not None:
+            uncached = []
+            for job in jobs:
+                params = build_message_params(job.lesson_data, job.activity_type, prompt_manager)
+                cached = response_cache.get(ResponseCache.make_key(params))
+                if cached is None:
+                    uncached.append(job)
+                else:
+                    write_atomic(job.filepath, cached)
+                    if manifest is not None:
+                        manifest.record(job.filepath, hash_json(params))
+            print(f"\nWrote {len(jobs) - len(uncached)} transcripts from the response cache")
+            jobs = uncached
+        if not jobs:
+            print("\nAll transcripts are up to date")
+            return
+        batch_id = submit_batch(client, jobs, prompt_manager, state_file)
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    
+    batch = client.messages.batches.retrieve(batch_id)
+    while batch.processing_status != "ended":
+        counts = batch.request_counts
+        print(f"  Batch {batch_id}: {batch.processing_status}, "
+              f"{counts.processing} processing, {counts.succeeded} succeeded, {counts.errored} errored")
+        time.sleep(poll_interval)
+        batch = client.messages.batches.retrieve(batch_id)
+    
+    usage_stats = UsageStats()
+    written = failed = 0
+    for entry in client.messages.batches.results(batch_id):
+        job = state["jobs"].get(entry.custom_id)
+        if job is None:
+            continue
+        filepath = Path(job["filepath"])
+        if entry.result.type != "succeeded":
+            error = getattr(entry.result, "error", None)
+            print(f"  Error processing {filepath.name}: {entry.result.type} {error or ''}")
+            failed += 1
+            continue
+        try:
+            text = extract_text(entry.result.message)
+            write_atomic(filepath, text)
+            if response_cache is not None and job.get("cache_key"):
+                response_cache.put(job["cache_key"], text)
+            # The cache key is the hash of the request params, i.e. the transcript's inputs
+            if manifest is not None and job.get("cache_key"):
+                manifest.record(filepath, job["cache_key"])
+            usage_stats.record(job["activity_type"], entry.result.message.usage)
+            record_usage({}, entry.result.message.usage)
+            written += 1
+        except Exception as e:
+            print(f"  Error writing {filepath.name}: {str(e)}")
+            failed += 1
+    
+    state_file.unlink()
+    if manifest is not None:
+        manifest.save()
+    print(f"\nBatch finished: {written} written, {failed} failed (rerun to retry failures)")
+    usage_stats.report()
+    if response_cache is not None:
+        response_cache.report()
 
 if __name__ == "__main__":
     import argparse
@@ -149,8 +648,62 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Generate Danish lesson transcripts')
     parser.add_argument('--test', action='store_true', help='Run in test mode (skip API calls)')
     parser.add_argument('--base-dir', default='danish', help='Base directory for Danish course')
+    parser.add_argument('--workers', type=int, default=1, help='Number of concurrent Claude requests')
+    parser.add_argument('--rpm', type=float, default=50, help='Requests per minute budget')
+    parser.add_argument('--input-tpm', type=float, default=40000, help='Input tokens per minute budget')
+    parser.add_argument('--output-tpm', type=float, default=8000, help='Output tokens per minute budget')
+    parser.add_argument('--max-retries', type=int, default=6, help='Retries for rate-limited or overloaded requests')
+    parser.add_argument('--batch', action='store_true', help='Submit all missing transcripts as one Message Batch')
+    parser.add_argument('--poll-interval', type=float, default=60.0, help='Seconds between batch status checks')
+    parser.add_argument('--base-url', default=None, help='API base URL, e.g. a local stub server')
+    parser.add_argument('--force', action='store_true', help='Regenerate existing transcripts (unchanged ones come from the cache)')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the local response cache')
+    parser.add_argument('--no-manifest', action='store_true', help='Only skip transcripts that exist, ignoring whether their inputs changed')
+    parser.add_argument('--cache-path', default='transcript_cache/responses.sqlite', help='Response cache database')
+    parser.add_argument('--cache-max-mb', type=float, default=256, help='Response cache size limit in MB')
+    parser.add_argument('--metrics', help='Append timings and token counts to this JSONL file and print a summary')
     
     args = parser.parse_args()
+    if args.batch and args.test:
+        parser.error("--batch submits a real Message Batch and cannot be combined with --test")
+    if args.metrics:
+        metrics.configure(args.metrics)
+    
+    rate_limiter = RateLimiter(
+        requests_per_minute=args.rpm,
+        input_tokens_per_minute=args.input_tpm,
+        output_tokens_per_minute=args.output_tpm,
+        max_retries=args.max_retries,
+        is_retryable=is_retryable_error
+    )
+    
+    response_cache = None
+    if not args.no_cache and not args.test:
+        response_cache = ResponseCache(args.cache_path, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+    
+    manifest = None
+    if not args.no_manifest and not args.test:
+        manifest = BuildManifest(args.base_dir)
     
     # Process all daily plans
-    process_lesson_plans(base_dir=args.base_dir, test_mode=args.test)
\ No newline at end of file
+    if args.batch:
+        process_lesson_plans_batch(
+            base_dir=args.base_dir,
+            poll_interval=args.poll_interval,
+            base_url=args.base_url,
+            response_cache=response_cache,
+            force=args.force,
+            manifest=manifest
+        )
+    else:
+        process_lesson_plans(
+            base_dir=args.base_dir,
+            test_mode=args.test,
+            max_workers=args.workers,
+            rate_limiter=rate_limiter,
+            base_url=args.base_url,
+            response_cache=response_cache,
+            force=args.force,
+            manifest=manifest
+        )
+    metrics.report()
\ No newline at end of file
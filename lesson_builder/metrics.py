@@ -0,0 +1,290 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+METRICS_PATH_ENV = "LESSON_METRICS"
+METRICS_RUN_ENV = "LESSON_METRICS_RUN"
+
+class Metrics:
+    """
+    Spans, timers and counters for the pipeline, written as JSON lines.
+
+    Spans mark coarse units of work (one Claude request, one lesson mp3, one combined
+    day) and are written as they end. Timers and counters are cheap enough for inner
+    loops: they are summed in memory and written when the outermost span of a thread
+    ends, and at exit. Worker processes inherit the output file and run id through the
+    environment, so one file describes a whole run. Nothing is recorded until
+    configure() is called or LESSON_METRICS is set.
+    """
+    def __init__(self):
+        self.path: Optional[Path] = None
+        self.run_id: Optional[str] = None
+        self._file = None
+        self._reset()
+        self._local = threading.local()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self) -> None:
+        # Also runs in forked children, which must not flush their parent's totals again
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timers: Dict[str, List[float]] = {}   # name -> [count, total_ms, max_ms]
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def configure(self, path: Union[str, Path], run_id: Optional[str] = None) -> str:
+        """
+        Start recording to a JSONL file (appended to), here and in child processes.
+
+        Args:
+            path: Metrics file
+            run_id: Identifier shared by every event of this run; generated if not given
+
+        Returns:
+            str: The run id
+        """
+        self.path = Path(path)
+        self.run_id = run_id or f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        os.environ[METRICS_PATH_ENV] = str(self.path)
+        os.environ[METRICS_RUN_ENV] = self.run_id
+        self._file = None
+        return self.run_id
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        event = {"run": self.run_id, "pid": os.getpid(), "ts": round(time.time(), 3), **event}
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(line)
+
+    def count(self, name: str, value: float = 1) -> None:
+        """Add value to a counter."""
+        if self.path is None:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record one duration of a timer."""
+        if self.path is None:
+            return
+        ms = seconds * 1000
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = [1, ms, ms]
+            else:
+                timer[0] += 1
+                timer[1] += ms
+                timer[2] = max(timer[2], ms)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    @contextmanager
+    def span(self, name: str, **fields) -> Iterator[Dict[str, Any]]:
+        """
+        Time the enclosed block and write it as one event.
+
+        Yields a dict of fields that the block may add to, e.g. token counts. The span
+        records its parent span, and the error if the block raised.
+        """
+        if self.path is None:
+            yield fields
+            return
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent = stack[-1][0] if stack else None
+        stack.append((name, fields))
+        start = time.perf_counter()
+        error = None
+        try:
+            yield fields
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            event = {"type": "span", "name": name, "ms": round((time.perf_counter() - start) * 1000, 3)}
+            if parent:
+                event["parent"] = parent
+            if error:
+                event["error"] = error
+            if fields:
+                event["fields"] = fields
+            self._write(event)
+            if not stack:
+                self.flush()
+
+    def annotate(self, **fields) -> None:
+        """Add fields to the innermost span open in this thread, if any."""
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1][1].update(fields)
+
+    def traced(self, name: str) -> Callable:
+        """
+        Decorator running every call in a span. A call returning False, the pipeline's
+        way of reporting a failed step, is marked failed.
+        """
+        def decorate(fn: Callable) -> Callable:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name) as fields:
+                    result = fn(*args, **kwargs)
+                    if result is False:
+                        fields["failed"] = True
+                    return result
+            return wrapper
+        return decorate
+
+    def timed(self, name: str) -> Callable:
+        """Decorator adding the duration of every call to a timer."""
+        def decorate(fn: Callable) -> Callable:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def flush(self) -> None:
+        """Write the counters and timers summed since the last flush."""
+        if self.path is None:
+            return
+        with self._lock:
+            counters, timers = self._counters, self._timers
+            self._counters, self._timers = {}, {}
+        for name, value in counters.items():
+            self._write({"type": "counter", "name": name, "value": value})
+        for name, (n, total, longest) in timers.items():
+            self._write({"type": "timer", "name": name, "count": n, "total_ms": round(total, 3), "max_ms": round(longest, 3)})
+
+    def report(self) -> None:
+        """Print the summary table of this run, including events from worker processes."""
+        if self.path is None:
+            return
+        self.flush()
+        print_summary(summarize(read_events(self.path, self.run_id)))
+
+def read_events(path: Union[str, Path], run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Events of one run from a metrics file.
+
+    Args:
+        path: Metrics file
+        run_id: Run to read; the last run in the file when None
+
+    Returns:
+        List[Dict[str, Any]]: The run's events in file order
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    if run_id is None and events:
+        run_id = events[-1].get("run")
+    return [event for event in events if event.get("run") == run_id]
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def summarize(events: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Combine the events of a run per name.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: For spans and timers: count, total_ms, mean_ms and
+            max_ms (spans also p50_ms, p95_ms and errors); for counters: value
+    """
+    spans: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    summary: Dict[str, Dict[str, Any]] = {}
+    for event in events:
+        name = event["name"]
+        if event["type"] == "span":
+            spans.setdefault(name, []).append(event["ms"])
+            if "error" in event:
+                errors[name] = errors.get(name, 0) + 1
+        elif event["type"] == "timer":
+            entry = summary.setdefault(name, {"type": "timer", "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += event["count"]
+            entry["total_ms"] += event["total_ms"]
+            entry["max_ms"] = max(entry["max_ms"], event["max_ms"])
+        elif event["type"] == "counter":
+            entry = summary.setdefault(name, {"type": "counter", "value": 0})
+            entry["value"] += event["value"]
+
+    for name, durations in spans.items():
+        durations.sort()
+        summary[name] = {
+            "type": "span",
+            "count": len(durations),
+            "total_ms": sum(durations),
+            "max_ms": durations[-1],
+            "p50_ms": percentile(durations, 0.5),
+            "p95_ms": percentile(durations, 0.95),
+            "errors": errors.get(name, 0)
+        }
+    for entry in summary.values():
+        if entry["type"] != "counter":
+            entry["mean_ms"] = entry["total_ms"] / entry["count"] if entry["count"] else 0.0
+    return summary
+
+def print_summary(summary: Dict[str, Dict[str, Any]]) -> None:
+    """Print spans and timers, slowest in total first, then counters and hit ratios."""
+    timed = sorted(((n, e) for n, e in summary.items() if e["type"] != "counter"), key=lambda item: -item[1]["total_ms"])
+    if timed:
+        print(f"\n{'name':<32} {'type':<6} {'count':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'errors':>6}")
+        for name, e in timed:
+            p50 = f"{e['p50_ms']:.1f}" if "p50_ms" in e else "-"
+            p95 = f"{e['p95_ms']:.1f}" if "p95_ms" in e else "-"
+            print(f"{name:<32} {e['type']:<6} {e['count']:>7} {e['total_ms'] / 1000:>9.2f} {e['mean_ms']:>9.1f} "
+                  f"{p50:>9} {p95:>9} {e['max_ms']:>9.1f} {e.get('errors', '-'):>6}")
+
+    counters = {n: e["value"] for n, e in summary.items() if e["type"] == "counter"}
+    if counters:
+        print(f"\n{'counter':<32} {'value':>12}")
+        for name in sorted(counters):
+            print(f"{name:<32} {counters[name]:>12,.0f}")
+        # name.hits / name.misses pairs
+        for name in sorted(n[:-len(".hits")] for n in counters if n.endswith(".hits")):
+            hits, misses = counters[f"{name}.hits"], counters.get(f"{name}.misses", 0)
+            if hits + misses:
+                print(f"{name + ' hit ratio':<32} {hits / (hits + misses):>12.1%}")
+
+metrics = Metrics()
+if os.getenv(METRICS_PATH_ENV):
+    # A worker process of a run that records metrics
+    metrics.configure(os.environ[METRICS_PATH_ENV], os.getenv(METRICS_RUN_ENV))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Summarize a metrics file written with --metrics')
+    parser.add_argument('path', help='Metrics JSONL file')
+    parser.add_argument('--run', help='Run id to summarize (default: the last run in the file)')
+
+    args = parser.parse_args()
+    events = read_events(args.path, args.run)
+    if events:
+        print(f"Run {events[0]['run']}: {len(events)} events")
+    print_summary(summarize(events))
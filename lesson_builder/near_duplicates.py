@@ -0,0 +1,289 @@
+import json
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+
+from phrase_corpus import DEFAULT_CORPUS_FILES, PhraseCorpus
+
+NGRAM_SIZE = 3
+DEFAULT_DIMENSIONS = 1024
+DEFAULT_THRESHOLD = 0.75
+BLOCK_SIZE = 1024
+
+NON_WORD_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+class PhraseEntry(NamedTuple):
+    """A Danish phrase and where it comes from"""
+    text: str
+    source: str    # human-readable origin, e.g. "lesson 1.1 phrase 3"
+    group: str     # a phrase and its modifications share a group and are never compared
+    origin: str    # "lesson" or "corpus"
+
+class DuplicateCluster(NamedTuple):
+    """Phrases linked by pairwise similarities at or above the threshold"""
+    members: List[PhraseEntry]
+    similarity: float    # highest pairwise similarity inside the cluster
+
+def normalize(text: str) -> str:
+    """Lower-case a phrase and reduce punctuation and runs of whitespace to single spaces."""
+    return NON_WORD_PATTERN.sub(" ", text.lower()).strip()
+
+def ngrams(text: str, n: int = NGRAM_SIZE) -> List[str]:
+    """Character n-grams of a normalized phrase, padded so word edges form their own n-grams."""
+    padded = f" {text} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+def vectorize(texts: List[str], n: int = NGRAM_SIZE, dimensions: int = DEFAULT_DIMENSIONS) -> np.ndarray:
+    """
+    Hash the character n-grams of every text into a fixed number of buckets.
+
+    Args:
+        texts: Normalized phrases
+        n: N-gram length
+        dimensions: Number of hash buckets per vector
+
+    Returns:
+        np.ndarray: float32 matrix with one L2-normalized row of bucket indicators per
+            text, so the dot product of two rows is the cosine similarity of their n-gram sets
+    """
+    buckets: Dict[str, int] = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    for i, text in enumerate(texts):
+        for gram in ngrams(text, n):
+            bucket = buckets.get(gram)
+            if bucket is None:
+                # crc32 rather than hash(): the buckets must not change between runs
+                bucket = buckets[gram] = zlib.crc32(gram.encode("utf-8")) % dimensions
+            rows.append(i)
+            cols.append(bucket)
+
+    matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+    matrix[np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)] = 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+def similar_pairs(
+    matrix: np.ndarray,
+    threshold: float = DEFAULT_THRESHOLD,
+    block_size: int = BLOCK_SIZE
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    All pairs of rows whose cosine similarity is at least the threshold.
+
+    Rows are sorted by the size of their bucket set. Two sets of sizes a <= b have a
+    cosine similarity of at most sqrt(a / b), so each block of rows is multiplied only
+    against itself and the following rows up to size max(a) / threshold². Every pair is
+    computed once and memory stays at block_size x rows.
+
+    Args:
+        matrix: Output of vectorize()
+        threshold: Minimum cosine similarity
+        block_size: Rows per matrix multiplication
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Row indices i < j and their similarities
+    """
+    sizes = np.count_nonzero(matrix, axis=1)
+    order = np.argsort(sizes, kind="stable")
+    sizes = sizes[order]
+    ordered = matrix[order]
+
+    firsts, seconds, scores = [], [], []
+    for start in range(0, len(ordered), block_size):
+        end = min(start + block_size, len(ordered))
+        if threshold > 0:
+            stop = int(np.searchsorted(sizes, sizes[end - 1] / threshold ** 2, side="right"))
+        else:
+            stop = len(ordered)
+        sims = ordered[start:end] @ ordered[start:stop].T
+        r, c = np.nonzero(sims >= threshold)
+        # Keep the upper triangle: c is relative to start, r to the block
+        upper = c > r
+        r, c = r[upper], c[upper]
+        firsts.append(order[r + start])
+        seconds.append(order[c + start])
+        scores.append(sims[r, c])
+    if not firsts:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    firsts, seconds = np.concatenate(firsts), np.concatenate(seconds)
+    return np.minimum(firsts, seconds), np.maximum(firsts, seconds), np.concatenate(scores)
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 with path halving and union by size."""
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> int:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+def find_duplicates(
+    entries: List[PhraseEntry],
+    threshold: float = DEFAULT_THRESHOLD,
+    n: int = NGRAM_SIZE,
+    dimensions: int = DEFAULT_DIMENSIONS,
+    block_size: int = BLOCK_SIZE
+) -> List[DuplicateCluster]:
+    """
+    Group phrases into clusters of near-duplicates.
+
+    Identical normalized texts are vectorized once. Entries of the same group (a lesson
+    phrase and its own modifications) are not linked to each other directly, since they
+    are meant to be similar.
+
+    Args:
+        entries: Phrases to compare
+        threshold: Minimum cosine similarity of character n-gram vectors
+        n: N-gram length
+        dimensions: Number of hash buckets per vector
+        block_size: Rows per matrix multiplication
+
+    Returns:
+        List[DuplicateCluster]: Clusters of two or more entries, most similar first
+    """
+    # One vector per distinct normalized text
+    text_ids: Dict[str, int] = {}
+    members: List[List[int]] = []
+    for i, entry in enumerate(entries):
+        key = normalize(entry.text)
+        if key not in text_ids:
+            text_ids[key] = len(members)
+            members.append([])
+        members[text_ids[key]].append(i)
+
+    matrix = vectorize(list(text_ids), n, dimensions)
+    firsts, seconds, scores = similar_pairs(matrix, threshold, block_size)
+
+    sets = UnionFind(len(entries))
+    best: Dict[int, float] = {}
+
+    def link(a: int, b: int, score: float) -> None:
+        if entries[a].group == entries[b].group:
+            return
+        root_a, root_b = sets.find(a), sets.find(b)
+        score = max(score, best.pop(root_a, 0.0), best.pop(root_b, 0.0))
+        best[sets.union(root_a, root_b)] = score
+
+    # Exact duplicates (after normalization): link each entry to the first entry of
+    # another group, so entries sharing a group with the first one still join
+    for ids in members:
+        firsts_by_group: Dict[str, int] = {}
+        for i in ids:
+            firsts_by_group.setdefault(entries[i].group, i)
+        reps = list(firsts_by_group.values())
+        if len(reps) < 2:
+            continue
+        for i in ids:
+            link(i, reps[1] if entries[i].group == entries[reps[0]].group else reps[0], 1.0)
+    for u, v, score in zip(firsts.tolist(), seconds.tolist(), scores.tolist()):
+        for a in members[u]:
+            for b in members[v]:
+                link(a, b, min(score, 1.0))
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(entries)):
+        root = sets.find(i)
+        if sets.size[root] > 1:
+            clusters.setdefault(root, []).append(i)
+
+    result = [
+        DuplicateCluster([entries[i] for i in ids], best.get(root, 0.0))
+        for root, ids in clusters.items()
+    ]
+    result.sort(key=lambda cluster: (-cluster.similarity, cluster.members[0].source))
+    return result
+
+def lesson_entries(content_config: Dict) -> List[PhraseEntry]:
+    """Every target phrase of every lesson, followed by its modifications."""
+    entries = []
+    for lesson in content_config["lessons"]:
+        lesson_number = lesson["lesson_number"]
+        for k, phrase in enumerate(lesson["target_phrases"], 1):
+            group = f"lesson {lesson_number}:{k}"
+            source = f"lesson {lesson_number} phrase {k}"
+            entries.append(PhraseEntry(phrase["danish"], source, group, "lesson"))
+            for m, modification in enumerate(phrase.get("modifications", []), 1):
+                entries.append(PhraseEntry(
+                    modification["danish"],
+                    f"{source} modification {m} ({modification.get('type', '?')})",
+                    group,
+                    "lesson"
+                ))
+    return entries
+
+def corpus_entries(corpus: PhraseCorpus) -> List[PhraseEntry]:
+    """Every phrase of the corpus."""
+    return [
+        PhraseEntry(phrase.danish, f"corpus [{phrase.level}] {phrase.context}", f"corpus:{i}", "corpus")
+        for i, phrase in enumerate(corpus.phrases)
+    ]
+
+def load_entries(
+    config_path: Union[str, Path] = "resources/lessons_content_config.json",
+    corpus_paths: Iterable[Union[str, Path]] = ()
+) -> List[PhraseEntry]:
+    """
+    Collect the lesson phrases and, optionally, the corpus phrases to compare.
+
+    Args:
+        config_path: Path to lessons_content_config.json
+        corpus_paths: Phrase corpus CSVs to include; none by default
+
+    Returns:
+        List[PhraseEntry]: Lesson entries first, then corpus entries
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        entries = lesson_entries(json.load(f))
+    corpus_paths = list(corpus_paths)
+    if corpus_paths:
+        entries.extend(corpus_entries(PhraseCorpus.load(corpus_paths)))
+    return entries
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Report near-duplicate phrases across lessons and the phrase corpus')
+    parser.add_argument('--config', default='resources/lessons_content_config.json', help='Lessons content config')
+    parser.add_argument('--include-corpus', action='store_true', help='Also compare against the phrase corpus CSVs')
+    parser.add_argument('--corpus-clusters', action='store_true', help='Also report clusters made only of corpus phrases')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Minimum cosine similarity (0-1)')
+    parser.add_argument('--ngram', type=int, default=NGRAM_SIZE, help='Character n-gram length')
+    parser.add_argument('--dimensions', type=int, default=DEFAULT_DIMENSIONS, help='Hash buckets per phrase vector')
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+    entries = load_entries(args.config, DEFAULT_CORPUS_FILES if args.include_corpus else ())
+    clusters = find_duplicates(entries, args.threshold, args.ngram, args.dimensions)
+    elapsed = time.perf_counter() - start
+
+    if not args.corpus_clusters:
+        clusters = [c for c in clusters if any(e.origin == "lesson" for e in c.members)]
+    for cluster in clusters:
+        print(f"\nSimilarity {cluster.similarity:.2f}:")
+        for entry in cluster.members:
+            print(f"  {entry.source}: {entry.text}")
+    print(f"\n{len(clusters)} duplicate clusters among {len(entries)} phrases ({elapsed:.2f}s)")
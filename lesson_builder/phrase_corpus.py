@@ -0,0 +1,228 @@
+import bisect
+import csv
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+DEFAULT_CORPUS_FILES = ("resources/danish_phrases_clean.csv", "resources/list_of_2000_phrases.csv")
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens of a phrase (letters such as æ, ø and å count as word characters)."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class Phrase:
+    """One corpus row. Slotted, so a corpus of thousands of phrases stays small."""
+    __slots__ = ("danish", "english", "context", "level")
+
+    def __init__(self, danish: str, english: str, context: str, level: str):
+        self.danish = danish
+        self.english = english
+        self.context = context
+        self.level = level
+
+    def to_target_phrase(self) -> Dict[str, str]:
+        """The phrase in the shape used by target_phrases in lessons_content_config.json."""
+        return {"danish": self.danish, "english": self.english}
+
+    def __repr__(self) -> str:
+        return f"Phrase({self.danish!r}, {self.english!r}, {self.context!r}, {self.level!r})"
+
+class PhraseCorpus:
+    """
+    The phrase corpus CSVs parsed once, with indexes by situational context, by CEFR
+    level and by Danish word token.
+
+    query() intersects the matching index entries, smallest first, so lookups such as
+    "A1 Accommodation phrases containing 'værelse'" touch only a handful of phrases.
+    """
+    def __init__(self, phrases: List[Phrase]):
+        self.phrases = phrases
+        self.by_context: Dict[str, Set[int]] = {}
+        self.by_level: Dict[str, Set[int]] = {}
+        self.by_token: Dict[str, Set[int]] = {}
+        for i, phrase in enumerate(phrases):
+            self.by_context.setdefault(phrase.context.lower(), set()).add(i)
+            self.by_level.setdefault(phrase.level.upper(), set()).add(i)
+            for token in tokenize(phrase.danish):
+                self.by_token.setdefault(token, set()).add(i)
+        # Sorted vocabulary for prefix lookups
+        self.tokens = sorted(self.by_token)
+
+    @classmethod
+    def load(cls, paths: Iterable[Union[str, Path]] = DEFAULT_CORPUS_FILES) -> "PhraseCorpus":
+        """
+        Parse the corpus CSVs into one corpus. Phrases found in several files are kept once.
+
+        Args:
+            paths: CSV files with danishPhrase, englishTranslation, situationalContext
+                and languageLevel columns
+
+        Returns:
+            PhraseCorpus: The indexed corpus
+        """
+        phrases = []
+        seen = set()
+        for path in paths:
+            with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                for row in csv.DictReader(f):
+                    danish = (row.get("danishPhrase") or "").strip()
+                    # Skip blank rows and header lines repeated inside the file
+                    if not danish or danish == "danishPhrase" or danish in seen:
+                        continue
+                    seen.add(danish)
+                    phrases.append(Phrase(
+                        danish,
+                        (row.get("englishTranslation") or "").strip(),
+                        (row.get("situationalContext") or "").strip(),
+                        (row.get("languageLevel") or "").strip()
+                    ))
+        return cls(phrases)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def contexts(self) -> Dict[str, int]:
+        """Situational contexts and their phrase counts."""
+        counts: Dict[str, int] = {}
+        for phrase in self.phrases:
+            counts[phrase.context] = counts.get(phrase.context, 0) + 1
+        return counts
+
+    def levels(self) -> Dict[str, int]:
+        """CEFR levels and their phrase counts."""
+        return {level: len(ids) for level, ids in sorted(self.by_level.items())}
+
+    def _token_ids(self, word: str, prefix: bool) -> Set[int]:
+        word = word.lower()
+        if not prefix:
+            return self.by_token.get(word, set())
+        ids: Set[int] = set()
+        start = bisect.bisect_left(self.tokens, word)
+        for token in self.tokens[start:]:
+            if not token.startswith(word):
+                break
+            ids |= self.by_token[token]
+        return ids
+
+    def query(
+        self,
+        context: Optional[str] = None,
+        level: Optional[Union[str, Iterable[str]]] = None,
+        contains: Optional[str] = None,
+        prefix: bool = False,
+        limit: Optional[int] = None
+    ) -> List[Phrase]:
+        """
+        Find phrases matching every given criterion, in corpus order.
+
+        Args:
+            context: Situational context, case-insensitive (e.g. 'Accommodation')
+            level: CEFR level or levels (e.g. 'A1' or ['A1', 'A2'])
+            contains: Danish words that must all occur in the phrase
+            prefix: Match the words in contains as word prefixes ('værelse' also finds 'værelset')
+            limit: Return at most this many phrases
+
+        Returns:
+            List[Phrase]: The matching phrases
+        """
+        candidates: List[Set[int]] = []
+        if context is not None:
+            candidates.append(self.by_context.get(context.lower(), set()))
+        if level is not None:
+            levels = [level] if isinstance(level, str) else list(level)
+            if len(levels) == 1:
+                candidates.append(self.by_level.get(levels[0].upper(), set()))
+            else:
+                ids: Set[int] = set()
+                for lvl in levels:
+                    ids |= self.by_level.get(lvl.upper(), set())
+                candidates.append(ids)
+        if contains:
+            for word in tokenize(contains):
+                candidates.append(self._token_ids(word, prefix))
+
+        if not candidates:
+            matches = range(len(self.phrases))
+        else:
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for ids in candidates[1:]:
+                if not result:
+                    break
+                result &= ids
+            matches = sorted(result)
+
+        if limit is not None:
+            matches = matches[:limit]
+        return [self.phrases[i] for i in matches]
+
+    def target_phrases(self, **criteria) -> List[Dict[str, str]]:
+        """query() results in the target_phrases format of lessons_content_config.json."""
+        return [phrase.to_target_phrase() for phrase in self.query(**criteria)]
+
+def set_lesson_phrases(config_path: Union[str, Path], lesson_number: float, target_phrases: List[Dict[str, str]]) -> None:
+    """
+    Replace the target_phrases of one lesson in a lessons content config, atomically.
+
+    Args:
+        config_path: Path to lessons_content_config.json
+        lesson_number: Lesson to update (e.g. 1.1)
+        target_phrases: New phrases, as returned by PhraseCorpus.target_phrases
+    """
+    config_path = Path(config_path)
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    for lesson in config["lessons"]:
+        if lesson["lesson_number"] == lesson_number:
+            lesson["target_phrases"] = target_phrases
+            break
+    else:
+        raise ValueError(f"Lesson {lesson_number} not found in {config_path}")
+
+    fd, tmp_path = tempfile.mkstemp(dir=config_path.parent, prefix=f".{config_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, config_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Search the phrase corpus and fill lesson target phrases')
+    parser.add_argument('--context', help='Situational context (e.g. Accommodation)')
+    parser.add_argument('--level', action='append', help='CEFR level; repeat for several (e.g. --level A1 --level A2)')
+    parser.add_argument('--contains', help='Danish words every phrase must contain')
+    parser.add_argument('--prefix', action='store_true', help='Match --contains words as prefixes')
+    parser.add_argument('--limit', type=int, help='Maximum number of phrases')
+    parser.add_argument('--json', action='store_true', help='Print matches as target_phrases JSON')
+    parser.add_argument('--list-contexts', action='store_true', help='List the situational contexts and exit')
+    parser.add_argument('--lesson', type=float, help='Write the matches as target_phrases of this lesson (e.g. 1.1)')
+    parser.add_argument('--config', default='resources/lessons_content_config.json', help='Lessons content config to update with --lesson')
+
+    args = parser.parse_args()
+    corpus = PhraseCorpus.load()
+
+    if args.list_contexts:
+        for context, count in sorted(corpus.contexts().items()):
+            print(f"{count:5d}  {context}")
+    else:
+        matches = corpus.query(args.context, args.level, args.contains, args.prefix, args.limit)
+        if args.lesson is not None:
+            set_lesson_phrases(args.config, args.lesson, [p.to_target_phrase() for p in matches])
+            print(f"Set {len(matches)} target phrases for lesson {args.lesson} in {args.config}")
+        elif args.json:
+            print(json.dumps([p.to_target_phrase() for p in matches], ensure_ascii=False, indent=4))
+        else:
+            for phrase in matches:
+                print(f"[{phrase.level}] {phrase.context}: {phrase.danish} - {phrase.english}")
+            print(f"\n{len(matches)} of {len(corpus)} phrases")
@@ -20,6 +20,7 @@ class PromptManager:
     def __init__(self, prompts_dir: str = "prompts"):
         self.prompts_dir = Path(prompts_dir)
         self.prompt_configs: Dict[str, PromptConfig] = {}
+        self._formatted: Dict[str, tuple[str, str]] = {}
         self._load_all_prompts()
     
     def _load_all_prompts(self):
@@ -76,7 +77,10 @@ class PromptManager:
         ])
     
     def format_for_claude(self, prompt_type: str) -> tuple[str, str]:
-        """Format the prompt and examples for Claude API."""
+        """Format the prompt and examples for Claude API. Results are cached per prompt type."""
+        if prompt_type in self._formatted:
+            return self._formatted[prompt_type]
+        
         config = self.get_prompt(prompt_type)
         
         # Format examples in Claude's expected format
@@ -94,7 +98,8 @@ class PromptManager:
                 
             examples_text += "\n</IDEAL_OUTPUT>\n</example>\n\n"
         
-        return config.system_prompt, examples_text
+        self._formatted[prompt_type] = (config.system_prompt, examples_text)
+        return self._formatted[prompt_type]
 
     def list_prompt_types(self) -> List[str]:
         """List all available prompt types."""
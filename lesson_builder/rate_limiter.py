@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Status codes worth retrying: timeouts, conflicts, rate limits, server errors and overload
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+def is_retryable_status(exc: BaseException) -> bool:
+    """Return True if the exception carries an HTTP status code worth retrying."""
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS_CODES
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """Read the retry-after header (in seconds) from an API error, if the server sent one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+class TokenBucket:
+    """
+    A per-minute budget that refills continuously.
+
+    Usage corrections may drive the balance negative, which simply delays
+    later callers until the debt has been refilled.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available. Requests larger than the capacity wait for a full bucket."""
+        self._refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount
+
+    def adjust(self, amount: float, now: float) -> None:
+        """Correct an earlier reservation once the real usage is known (positive amount debits)."""
+        self._refill(now)
+        self.tokens -= amount
+
+class RateLimiter:
+    """
+    Paces API calls against requests, input token and output token per-minute budgets
+    and retries rate-limited or overloaded calls with jittered exponential backoff.
+    Safe to share between threads.
+    """
+    def __init__(
+        self,
+        requests_per_minute: float = 50,
+        input_tokens_per_minute: float = 40000,
+        output_tokens_per_minute: float = 8000,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        is_retryable: Callable[[BaseException], bool] = is_retryable_status
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_retryable = is_retryable
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, input_tokens: int, output_tokens: int) -> None:
+        """Block until one request with the estimated token usage fits in the budgets."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(
+                    self.requests.wait_time(1, now),
+                    self.input_tokens.wait_time(input_tokens, now),
+                    self.output_tokens.wait_time(output_tokens, now),
+                    self._paused_until - now
+                )
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.input_tokens.take(input_tokens)
+                    self.output_tokens.take(output_tokens)
+                    return
+            # Wake up regularly: settle() refunds over-estimates from finished requests
+            time.sleep(min(wait, 1.0))
+
+    def settle(self, estimated_input: int, estimated_output: int, actual_input: int, actual_output: int) -> None:
+        """Replace the estimated token usage of a finished request with its actual usage."""
+        with self._lock:
+            now = time.monotonic()
+            self.input_tokens.adjust(actual_input - estimated_input, now)
+            self.output_tokens.adjust(actual_output - estimated_output, now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for the given number of seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number attempt (0-based), honouring retry-after when present."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn: Callable[[], T], input_tokens: int, output_tokens: int) -> T:
+        """
+        Run fn within the budgets, retrying retryable errors. Each attempt reserves
+        the estimated tokens; the reservation of a failed attempt is refunded.
+
+        Args:
+            fn: Zero-argument callable making the API request
+            input_tokens: Estimated input tokens for the request
+            output_tokens: Estimated (or maximum) output tokens for the request
+
+        Returns:
+            Whatever fn returns
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(input_tokens, output_tokens)
+            try:
+                return fn()
+            except Exception as e:
+                # A failed request produced no tokens; return its reservation so the
+                # retry (or the next caller) does not pay for it twice
+                self.settle(input_tokens, output_tokens, 0, 0)
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    raise
+                retry_after = get_retry_after(e)
+                delay = self.backoff_delay(attempt, retry_after)
+                status = getattr(e, "status_code", type(e).__name__)
+                print(f"  Request failed ({status}), retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_retries})")
+                # A 429 means the whole account is over budget, so hold back every worker
+                if getattr(e, "status_code", None) == 429:
+                    self.pause(delay)
+                else:
+                    time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+def estimate_tokens(*texts: Any) -> int:
+    """Rough token estimate for budgeting (about 3.5 characters per token for mixed Danish/English)."""
+    return int(sum(len(str(t)) for t in texts) / 3.5) + 1
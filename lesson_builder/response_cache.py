@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from build_manifest import hash_json
+
+class ResponseCache:
+    """
+    Content-addressed store of model responses in a local SQLite file.
+
+    Entries are keyed by a hash of the full request parameters (model, temperature,
+    system prompt, examples and lesson data), so any change to a prompt or plan
+    misses the cache while unchanged requests are answered locally. When the
+    stored text exceeds max_bytes, the least recently used entries are evicted.
+    """
+    def __init__(self, path: str = "transcript_cache/responses.sqlite", max_bytes: int = 256 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(params: Dict[str, Any]) -> str:
+        """Hash request parameters into a cache key, independent of dict ordering."""
+        return hash_json(params)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """Store a response and evict least recently used entries beyond max_bytes."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def report(self) -> None:
+        """Print the hit ratio of this run."""
+        lookups = self.hits + self.misses
+        if lookups:
+            print(f"\nResponse cache: {self.hits}/{lookups} hits ({self.hits / lookups:.0%})")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,378 @@
+import csv
+import io
+import json
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydub.generators import Sine
+
+from rate_limiter import TokenBucket
+
+@dataclass
+class ClaudeStubConfig:
+    latency_ms: int = 0               # Delay before answering each messages request
+    batch_processing_sec: float = 1.0 # Time before a submitted batch reports "ended"
+    requests_per_minute: Optional[float] = None  # Answer 429 beyond this rate
+    filler_rows: int = 0              # Extra rows per transcript, to enlarge responses
+
+@dataclass
+class TTSStubConfig:
+    latency_ms: int = 0               # Delay before the first audio byte
+    ms_per_char: float = 60.0         # Speech duration per character of text; sets the payload size
+    bitrate: str = "128k"
+    requests_per_minute: Optional[float] = None  # Answer 429 beyond this rate
+    max_concurrent: Optional[int] = None         # Answer 429 beyond this many requests in flight
+
+class RequestLimiter:
+    """Server-side rate and concurrency limits, answered with 429 and retry-after like the real APIs."""
+    def __init__(self, requests_per_minute: Optional[float] = None, max_concurrent: Optional[int] = None):
+        self.bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def admit(self) -> Optional[float]:
+        """Start a request; returns None if admitted, else the seconds the client should wait."""
+        with self.lock:
+            if self.max_concurrent is not None and self.in_flight >= self.max_concurrent:
+                return 1.0
+            if self.bucket is not None:
+                wait = self.bucket.wait_time(1, time.monotonic())
+                if wait > 0:
+                    return wait
+                self.bucket.take(1)
+            self.in_flight += 1
+            return None
+
+    def release(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+def fake_transcript(lesson_data: Dict[str, Any], filler_rows: int = 0) -> str:
+    """Build a plausible CSV transcript from the lesson data sent to the model."""
+    rows = [["order_id", "voice_id", "text", "repeat", "delay"]]
+    rows.append([1, "en_f_voice", f"Welcome to the lesson: {lesson_data.get('title', '')}", 1, 1000])
+    for phrase in lesson_data.get("recap_phrases", []) + lesson_data.get("target_phrases", []):
+        rows.append([len(rows), "da_f_voice", phrase.get("danish", ""), 2, 2000])
+        rows.append([len(rows), "en_f_voice", phrase.get("english", ""), 1, 1000])
+    for i in range(filler_rows):
+        rows.append([len(rows), "en_f_voice", f"Listen and repeat, number {i + 1}.", 1, 1000])
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+def fake_message(params: Dict[str, Any], filler_rows: int = 0) -> Dict[str, Any]:
+    """Answer a messages request body the way the Messages API would."""
+    content = params["messages"][-1]["content"]
+    blocks = content if isinstance(content, list) else [{"type": "text", "text": content}]
+    try:
+        lesson_data = json.loads(blocks[-1]["text"])
+    except (ValueError, KeyError):
+        lesson_data = {}
+    text = fake_transcript(lesson_data, filler_rows)
+
+    # Everything up to the last cache breakpoint is reported as a cache read
+    system = params.get("system", "")
+    system_text = system if isinstance(system, str) else "".join(b.get("text", "") for b in system)
+    breakpoints = [i for i, b in enumerate(blocks) if b.get("cache_control")]
+    prefix = blocks[:breakpoints[-1] + 1] if breakpoints else []
+    total = len(system_text) + sum(len(b.get("text", "")) for b in blocks)
+    cached = (len(system_text) + sum(len(b.get("text", "")) for b in prefix)) // 4 if prefix else 0
+    uncached = total // 4 - cached
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "stub"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": uncached,
+            "output_tokens": len(text) // 4,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": cached
+        }
+    }
+
+def send_rate_limited(handler: BaseHTTPRequestHandler, body: Any, retry_after: float) -> None:
+    """Answer 429 with a retry-after header."""
+    payload = json.dumps(body).encode()
+    handler.send_response(429)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(payload)))
+    handler.send_header("retry-after", f"{max(retry_after, 0.001):.3f}")
+    handler.end_headers()
+    handler.wfile.write(payload)
+
+class ClaudeStubServer(ThreadingHTTPServer):
+    """HTTP server mimicking the Messages and Message Batches endpoints."""
+    daemon_threads = True
+
+    def __init__(self, address, config: Optional[ClaudeStubConfig] = None):
+        super().__init__(address, ClaudeStubHandler)
+        self.config = config or ClaudeStubConfig()
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.limiter = RequestLimiter(self.config.requests_per_minute)
+        self.stats = {"requests": 0, "throttled": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def batch_object(self, batch_id: str) -> Dict[str, Any]:
+        batch = self.batches[batch_id]
+        ended = time.monotonic() - batch["submitted"] >= self.config.batch_processing_sec
+        count = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": batch["created_at"],
+            "expires_at": batch["expires_at"],
+            "ended_at": batch["created_at"] if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch_id}/results" if ended else None
+        }
+
+class ClaudeStubHandler(BaseHTTPRequestHandler):
+    server: ClaudeStubServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body: Any, status: int = 200) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        if self.path == "/v1/messages":
+            params = self._read_json()
+            retry_after = self.server.limiter.admit()
+            if retry_after is not None:
+                with self.server.lock:
+                    self.server.stats["throttled"] += 1
+                send_rate_limited(self, {"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"}}, retry_after)
+                return
+            try:
+                time.sleep(self.server.config.latency_ms / 1000)
+                self._send_json(fake_message(params, self.server.config.filler_rows))
+            finally:
+                self.server.limiter.release()
+            with self.server.lock:
+                self.server.stats["requests"] += 1
+        elif self.path == "/v1/messages/batches":
+            requests = self._read_json()["requests"]
+            batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+            now = datetime.now(timezone.utc)
+            with self.server.lock:
+                self.server.batches[batch_id] = {
+                    "requests": requests,
+                    "submitted": time.monotonic(),
+                    "created_at": now.isoformat(),
+                    "expires_at": (now + timedelta(hours=24)).isoformat()
+                }
+                self._send_json(self.server.batch_object(batch_id))
+        else:
+            self._send_json({"type": "error", "error": {"type": "not_found_error", "message": self.path}}, 404)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) < 4 or parts[:3] != ["v1", "messages", "batches"] or parts[3] not in self.server.batches:
+            self._send_json({"type": "error", "error": {"type": "not_found_error", "message": self.path}}, 404)
+            return
+        batch_id = parts[3]
+        if len(parts) == 4:
+            with self.server.lock:
+                self._send_json(self.server.batch_object(batch_id))
+            return
+
+        lines: List[str] = []
+        for request in self.server.batches[batch_id]["requests"]:
+            lines.append(json.dumps({
+                "custom_id": request["custom_id"],
+                "result": {"type": "succeeded", "message": fake_message(request["params"], self.server.config.filler_rows)}
+            }))
+        payload = ("\n".join(lines) + "\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/binary")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def start_claude_stub(host: str = "127.0.0.1", port: int = 0, config: Optional[ClaudeStubConfig] = None) -> ClaudeStubServer:
+    """
+    Start a Claude stub server on a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind, 0 picks a free one
+        config: Latency and batch timing settings
+
+    Returns:
+        The running server; point the client at server.base_url
+    """
+    server = ClaudeStubServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class TTSStubServer(ThreadingHTTPServer):
+    """HTTP server mimicking the ElevenLabs text-to-speech endpoints."""
+    daemon_threads = True
+
+    def __init__(self, address, config: Optional[TTSStubConfig] = None):
+        super().__init__(address, TTSStubHandler)
+        self.config = config or TTSStubConfig()
+        self.lock = threading.Lock()
+        self.limiter = RequestLimiter(self.config.requests_per_minute, self.config.max_concurrent)
+        self.stats = {"requests": 0, "throttled": 0, "characters": 0, "bytes": 0}
+        self._audio: Dict[Tuple[str, int], bytes] = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def audio(self, voice_id: str, text: str) -> bytes:
+        """
+        An mp3 tone as long as the text would take to speak, distinct per voice.
+
+        Clips are encoded once per voice and duration (in 50 ms steps), so the stub
+        itself costs next to nothing while the client decodes realistic payloads.
+        """
+        duration = max(200, int(len(text) * self.config.ms_per_char) // 50 * 50)
+        key = (voice_id, duration)
+        with self.lock:
+            cached = self._audio.get(key)
+        if cached is None:
+            buffer = io.BytesIO()
+            frequency = 220 + zlib.crc32(voice_id.encode()) % 440
+            Sine(frequency).to_audio_segment(duration=duration).export(buffer, format="mp3", bitrate=self.config.bitrate)
+            cached = buffer.getvalue()
+            with self.lock:
+                self._audio[key] = cached
+        return cached
+
+class TTSStubHandler(BaseHTTPRequestHandler):
+    server: TTSStubServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_error(self, status: int, message: str) -> None:
+        payload = json.dumps({"detail": {"status": "error", "message": message}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if len(parts) not in (3, 4) or parts[:2] != ["v1", "text-to-speech"] or parts[3:] not in ([], ["stream"]):
+            self._send_error(404, self.path)
+            return
+        if not self.headers.get("xi-api-key"):
+            self._send_error(401, "Missing xi-api-key header")
+            return
+
+        server = self.server
+        retry_after = server.limiter.admit()
+        if retry_after is not None:
+            with server.lock:
+                server.stats["throttled"] += 1
+            send_rate_limited(self, {"detail": {"status": "too_many_concurrent_requests", "message": "Rate limited"}}, retry_after)
+            return
+        try:
+            text = body.get("text", "")
+            audio = server.audio(parts[2], text)
+            time.sleep(server.config.latency_ms / 1000)
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+        finally:
+            server.limiter.release()
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["characters"] += len(text)
+            server.stats["bytes"] += len(audio)
+
+def start_tts_stub(host: str = "127.0.0.1", port: int = 0, config: Optional[TTSStubConfig] = None) -> TTSStubServer:
+    """
+    Start an ElevenLabs stub server on a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind, 0 picks a free one
+        config: Latency, payload size and rate limit settings
+
+    Returns:
+        The running server; set ELEVENLABS_BASE_URL to server.base_url
+    """
+    server = TTSStubServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run local stand-ins for the Claude and ElevenLabs APIs')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the Claude stub')
+    parser.add_argument('--tts-port', type=int, default=8766, help='Port for the ElevenLabs stub')
+    parser.add_argument('--latency-ms', type=int, default=0, help='Delay before answering each message')
+    parser.add_argument('--batch-seconds', type=float, default=1.0, help='Time until a batch has ended')
+    parser.add_argument('--rpm', type=float, default=None, help='Claude requests per minute before answering 429')
+    parser.add_argument('--filler-rows', type=int, default=0, help='Extra rows per generated transcript')
+    parser.add_argument('--tts-latency-ms', type=int, default=0, help='Delay before each audio response')
+    parser.add_argument('--ms-per-char', type=float, default=60.0, help='Generated speech duration per character')
+    parser.add_argument('--tts-rpm', type=float, default=None, help='TTS requests per minute before answering 429')
+    parser.add_argument('--tts-concurrency', type=int, default=None, help='TTS requests in flight before answering 429')
+
+    args = parser.parse_args()
+
+    tts_server = start_tts_stub(port=args.tts_port, config=TTSStubConfig(
+        latency_ms=args.tts_latency_ms,
+        ms_per_char=args.ms_per_char,
+        requests_per_minute=args.tts_rpm,
+        max_concurrent=args.tts_concurrency
+    ))
+    server = ClaudeStubServer(
+        ("127.0.0.1", args.port),
+        ClaudeStubConfig(
+            latency_ms=args.latency_ms,
+            batch_processing_sec=args.batch_seconds,
+            requests_per_minute=args.rpm,
+            filler_rows=args.filler_rows
+        )
+    )
+    print(f"Claude stub listening on {server.base_url} (set ANTHROPIC_BASE_URL or pass --base-url)")
+    print(f"ElevenLabs stub listening on {tts_server.base_url} (set ELEVENLABS_BASE_URL or pass --base-url)")
+    server.serve_forever()
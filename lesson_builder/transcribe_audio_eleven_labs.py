@@ -2,11 +2,32 @@ from pathlib import Path
 import os
 import csv
 import json
-import hashlib
+import shutil
+import tempfile
+import threading
 import requests
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from pydub import AudioSegment
-from typing import Dict, Optional, TypedDict, List, Union
+from typing import Callable, Dict, Optional, Set, TypedDict, List, Union, NamedTuple, Tuple
+from build_manifest import BuildManifest, hash_file, hash_files, hash_json
+from audio_assembler import ChunkedMp3Writer, Mp3StreamWriter, PcmAssembler, PcmPool, audio_duration_ms, concat_audio, make_scratch_dir, match_format
+from metrics import metrics
+from rate_limiter import RateLimiter, is_retryable_status
+
+MODEL_ID = "eleven_multilingual_v2"
+TTS_BASE_URL = "https://api.elevenlabs.io"
+TTS_PATH = "/v1/text-to-speech/{voice_id}/stream"
+STREAM_CHUNK_BYTES = 64 * 1024
+TTS_MAX_RETRIES = 6
+
+_shared_session: Optional[requests.Session] = None
+_shared_session_workers = 0
+_session_lock = threading.Lock()
+_worker_pcm_pool: Optional[PcmPool] = None
+_tts_rate_limiter: Optional[RateLimiter] = None
 
 class VoiceSettings(TypedDict):
     stability: float
@@ -16,6 +37,31 @@ class VoiceConfig(TypedDict):
     id: str
     settings: VoiceSettings
 
+class Utterance(NamedTuple):
+    """One distinct piece of synthesized speech: everything the TTS output depends on"""
+    text: str
+    voice_id: str   # ElevenLabs voice ID
+    settings: str   # Voice settings as canonical JSON, so the tuple stays hashable
+    model_id: str
+
+class Cue(TypedDict):
+    """Where one transcript row sits in a lesson mp3; the span includes its repeats and pauses"""
+    order_id: int
+    voice_id: str
+    text: str
+    start_ms: int
+    end_ms: int
+    clip: str         # clip_key of the row's utterance
+    repeat: int
+    delay: int
+    start_frame: int  # Sample-accurate span, used to splice rows when patching
+    end_frame: int
+
+class AudioJob(NamedTuple):
+    csv_file: Path
+    output_filename: Path
+    input_hash: Optional[str]
+
 class VoiceMapper:
     def __init__(self):
         self.config_path = "resources/voice_config.json"
@@ -82,13 +128,283 @@ def load_api_key():
         raise ValueError("API key not found! Please set ELEVENLABS_API_KEY environment variable.")
     return api_key
 
-def get_cache_filename(text, voice_id):
-    """Generate a unique cache filename based on text and voice_id"""
-    content_hash = hashlib.md5(f"{text}{voice_id}".encode()).hexdigest()
-    return f"cache_{content_hash}.mp3"
+def create_tts_session(max_workers: int = 4) -> requests.Session:
+    """Create a requests session with the API key header set, keeping a connection alive for each of max_workers threads"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_workers, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json",
+        "xi-api-key": load_api_key()
+    })
+    return session
+
+def get_tts_session(max_workers: int = 4) -> requests.Session:
+    """Return the process-wide TTS session, creating it on first use or when it has fewer connections than max_workers"""
+    global _shared_session, _shared_session_workers
+    with _session_lock:
+        if _shared_session is None or _shared_session_workers < max_workers:
+            _shared_session = create_tts_session(max_workers)
+            _shared_session_workers = max_workers
+        return _shared_session
+
+def is_retryable_tts_error(exc: BaseException) -> bool:
+    """Retry rate limits and server errors, plus dropped connections and timeouts"""
+    return is_retryable_status(exc) or isinstance(
+        exc, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+    )
+
+def get_tts_rate_limiter() -> RateLimiter:
+    """
+    Return the process-wide limiter retrying TTS requests, creating it on first use.
+    
+    ElevenLabs limits concurrent requests rather than requests per minute, so the
+    budgets are left open; the limiter backs off throttled requests (honouring
+    retry-after) and holds back every worker of the process after a 429.
+    """
+    global _tts_rate_limiter
+    with _session_lock:
+        if _tts_rate_limiter is None:
+            _tts_rate_limiter = RateLimiter(
+                requests_per_minute=1e9,
+                input_tokens_per_minute=1e9,
+                output_tokens_per_minute=1e9,
+                max_retries=TTS_MAX_RETRIES,
+                is_retryable=is_retryable_tts_error
+            )
+        return _tts_rate_limiter
+
+class TTSError(Exception):
+    """A failed TTS response; carries status_code and response like the API client errors rate_limiter expects"""
+    def __init__(self, response: requests.Response):
+        super().__init__(f"TTS request failed with status {response.status_code}: {response.text[:200]}")
+        self.status_code = response.status_code
+        self.response = response
+
+def get_tts_url(voice_id: str) -> str:
+    """Streaming TTS endpoint for a voice; ELEVENLABS_BASE_URL overrides the host, e.g. with a local stub server"""
+    base_url = os.getenv('ELEVENLABS_BASE_URL') or TTS_BASE_URL
+    return base_url.rstrip('/') + TTS_PATH.format(voice_id=voice_id)
+
+def clip_key(utterance: Utterance) -> str:
+    """Hash of every synthesis parameter (text, voice, settings, model)"""
+    return hash_json(utterance._asdict())
+
+def get_cache_filename(utterance: Utterance):
+    """Generate a unique cache filename from every synthesis parameter (text, voice, settings, model)"""
+    return f"cache_{clip_key(utterance)}.mp3"
+
+def get_cache_path(utterance: Utterance, cache_dir="audio_cache") -> Path:
+    """Cache location of the audio for an utterance"""
+    return Path(cache_dir) / get_cache_filename(utterance)
+
+def make_utterance(text, voice_id, voice_mapper) -> Utterance:
+    """Resolve a CSV row's text and voice into the full set of synthesis parameters"""
+    elevenlabs_voice_id = voice_mapper.get_voice_id(voice_id)
+    if not elevenlabs_voice_id:
+        raise ValueError(f"No ElevenLabs voice ID found for voice: {voice_id}")
+    voice_settings = voice_mapper.get_voice_settings(voice_id) or {
+        "stability": 0.5,
+        "similarity_boost": 0.5
+    }
+    return Utterance(text, elevenlabs_voice_id, json.dumps(voice_settings, sort_keys=True), MODEL_ID)
+
+def stream_speech(session: requests.Session, utterance: Utterance, cache_filename: Path) -> int:
+    """
+    Send one streaming TTS request and store the audio at cache_filename.
+    
+    The audio is written to a temporary file as it arrives and renamed into place only
+    once complete, so an interrupted request never leaves a truncated cache entry.
+    
+    Returns:
+        int: Number of bytes written
+    
+    Raises:
+        TTSError: If the endpoint answers with anything but 200
+    """
+    data = {
+        "text": utterance.text,
+        "model_id": utterance.model_id,
+        "voice_settings": json.loads(utterance.settings)
+    }
+    
+    tmp_path = None
+    try:
+        with session.post(get_tts_url(utterance.voice_id), json=data, stream=True) as response:
+            if response.status_code != 200:
+                raise TTSError(response)
+            
+            fd, tmp_path = tempfile.mkstemp(dir=cache_filename.parent, prefix=f".{cache_filename.stem}.", suffix=".part")
+            written = 0
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                    f.write(chunk)
+                    written += len(chunk)
+        if not written:
+            raise ValueError(f"empty audio stream for '{utterance.text}'")
+        os.replace(tmp_path, cache_filename)
+        tmp_path = None
+        return written
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+@metrics.timed("tts.request")
+def synthesize_utterance(utterance: Utterance, cache_filename: Path, session: Optional[requests.Session] = None) -> bool:
+    """
+    Request speech from the ElevenLabs streaming endpoint and store it at cache_filename.
+    
+    Rate limited (429) and failed (5xx) requests and dropped connections are retried
+    with jittered backoff, honouring retry-after (see get_tts_rate_limiter).
+    """
+    cache_filename.parent.mkdir(exist_ok=True)
+    
+    try:
+        session = session or get_tts_session()
+        written = get_tts_rate_limiter().call(lambda: stream_speech(session, utterance, cache_filename), 0, 0)
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        metrics.count("tts.errors")
+        return False
+    
+    metrics.count("tts.requests")
+    metrics.count("tts.characters", len(utterance.text))
+    metrics.count("tts.bytes", written)
+    print(f"Audio file generated and cached as '{cache_filename}'")
+    return True
+
+def synthesize_to_cache(text, voice_id, voice_mapper, cache_dir="audio_cache", session: Optional[requests.Session] = None) -> bool:
+    """Request speech from ElevenLabs and store it in the cache"""
+    utterance = make_utterance(text, voice_id, voice_mapper)
+    return synthesize_utterance(utterance, get_cache_path(utterance, cache_dir), session)
+
+def read_transcript(csv_filename) -> List[Dict[str, str]]:
+    """Read a transcript CSV, sorted by order_id"""
+    with open(csv_filename, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        return sorted(reader, key=lambda x: int(x['order_id']))
+
+def plan_utterances(entries, voice_mapper, cache_dir="audio_cache") -> Dict[Utterance, Path]:
+    """Map the distinct utterances among CSV rows to their cache paths"""
+    planned = {}
+    for entry in entries:
+        utterance = make_utterance(entry['text'], entry['voice_id'], voice_mapper)
+        if utterance not in planned:
+            planned[utterance] = get_cache_path(utterance, cache_dir)
+    return planned
+
+def synthesize_utterances(
+    planned: Dict[Utterance, Path],
+    max_workers: int = 4,
+    session: Optional[requests.Session] = None,
+    count_lookups: bool = True
+) -> bool:
+    """
+    Synthesize every planned utterance that is not cached yet, concurrently.
+    
+    Args:
+        planned: Distinct utterances mapped to their cache paths
+        max_workers: Maximum number of concurrent TTS requests
+        session: Pooled session to send requests with; the shared session is created
+            only once a clip turns out to be missing
+        count_lookups: Add the cache lookups to the tts.cache metrics; off when the
+            same utterances were already looked up by prefetch_course_audio
+    
+    Returns:
+        bool: True if every missing clip was synthesized
+    """
+    missing = {u: path for u, path in planned.items() if not path.exists()}
+    if count_lookups:
+        metrics.count("tts.cache.hits", len(planned) - len(missing))
+        metrics.count("tts.cache.misses", len(missing))
+    if not missing:
+        return True
+    
+    if session is None:
+        try:
+            session = get_tts_session(max_workers)
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return False
+    
+    print(f"Synthesizing {len(missing)} uncached clips with {max_workers} workers...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda item: synthesize_utterance(item[0], item[1], session),
+            missing.items()
+        ))
+    return all(results)
+
+def synthesize_missing(entries, voice_mapper, cache_dir="audio_cache", max_workers: int = 4, session: Optional[requests.Session] = None, count_lookups: bool = True) -> bool:
+    """
+    Synthesize every distinct utterance in entries that is not cached yet, concurrently.
+    
+    Args:
+        entries: CSV rows with 'text' and 'voice_id' columns
+        voice_mapper: VoiceMapper resolving CSV voice IDs
+        cache_dir: Audio cache directory
+        max_workers: Maximum number of concurrent TTS requests
+        session: Pooled session to send requests with
+        count_lookups: Add the cache lookups to the tts.cache metrics
+    
+    Returns:
+        bool: True if every missing clip was synthesized
+    """
+    return synthesize_utterances(plan_utterances(entries, voice_mapper, cache_dir), max_workers, session, count_lookups)
+
+def prefetch_course_audio(csv_files: List[Path], voice_mapper, cache_dir="audio_cache", max_workers: int = 4, reusable: Optional[Set[str]] = None) -> Tuple[bool, List[Path]]:
+    """
+    Synthesize the distinct utterances of many transcripts in one pass.
+    
+    The same phrase and voice recur across activities and days; planning over every
+    CSV first means each is requested exactly once, after which every lesson is
+    assembled from the shared cache.
+    
+    Args:
+        csv_files: Transcript CSVs about to be rendered
+        voice_mapper: VoiceMapper resolving CSV voice IDs
+        cache_dir: Audio cache directory
+        max_workers: Maximum number of concurrent TTS requests
+        reusable: Clip keys whose audio can be taken from previously rendered lessons
+            instead (see patch_lesson); these are not synthesized
+    
+    Returns:
+        Tuple[bool, List[Path]]: True if every missing clip was synthesized, and the
+            transcripts that could not be read (unknown voice, bad order_id, ...), which
+            were left out
+    """
+    planned: Dict[Utterance, Path] = {}
+    rows = 0
+    unreadable = []
+    for csv_file in csv_files:
+        try:
+            entries = read_transcript(csv_file)
+            transcript_plan = plan_utterances(entries, voice_mapper, cache_dir)
+        except Exception as e:
+            print(f"Error processing CSV {csv_file}: {str(e)}")
+            unreadable.append(csv_file)
+            continue
+        rows += len(entries)
+        planned.update(transcript_plan)
+    if reusable:
+        planned = {u: path for u, path in planned.items() if path.exists() or clip_key(u) not in reusable}
+    
+    cached = sum(1 for path in planned.values() if path.exists())
+    print(f"\n{rows} rows across {len(csv_files) - len(unreadable)} transcripts use {len(planned)} distinct utterances "
+          f"({cached} already cached)")
+    return synthesize_utterances(planned, max_workers), unreadable
 
-def generate_speech(text, voice_id, output_filename, voice_mapper, test_mode=False, cache_dir="audio_cache"):
-    """Generate speech and save to a specific filename, with caching"""
+@metrics.timed("tts.generate_speech")
+def generate_speech(text, voice_id, output_filename, voice_mapper, test_mode=False, cache_dir="audio_cache", session: Optional[requests.Session] = None) -> Optional[Path]:
+    """
+    Generate speech, with caching, and return the path of the cached mp3.
+    
+    The audio is never transcoded: callers can decode the returned path directly.
+    If output_filename is given, the cached mp3 is also copied there byte for byte.
+    Returns None if synthesis failed.
+    """
     if test_mode:
         # In test mode, write text file instead of generating audio
         output_path = output_filename.replace('.mp3', '.txt')
@@ -98,87 +414,271 @@ def generate_speech(text, voice_id, output_filename, voice_mapper, test_mode=Fal
             voice_settings = voice_mapper.get_voice_settings(voice_id)
             f.write(f"Voice Settings: {json.dumps(voice_settings, indent=2)}\n")
         print(f"Test mode: Created text file at {output_path}")
-        return True
-    # Create cache directory if it doesn't exist
-    cache_dir = Path(cache_dir)
-    cache_dir.mkdir(exist_ok=True)
+        return Path(output_path)
     
-    # Get the actual ElevenLabs voice ID and settings
-    elevenlabs_voice_id = voice_mapper.get_voice_id(voice_id)
-    voice_settings = voice_mapper.get_voice_settings(voice_id)
+    # Check cache first; if not in cache, generate new audio
+    utterance = make_utterance(text, voice_id, voice_mapper)
+    cache_filename = get_cache_path(utterance, cache_dir)
+    cached = cache_filename.exists()
+    metrics.count("tts.cache.hits" if cached else "tts.cache.misses")
+    if not cached and not synthesize_utterance(utterance, cache_filename, session):
+        return None
     
-    if not elevenlabs_voice_id:
-        raise ValueError(f"No ElevenLabs voice ID found for voice: {voice_id}")
+    if output_filename:
+        shutil.copyfile(cache_filename, output_filename)
+    return cache_filename
+
+def audio_input_hash(csv_filename, voice_mapper: VoiceMapper, chunk_duration_sec: int = 600) -> str:
+    """Hash everything a lesson mp3 is built from: the CSV rows, the settings of the voices they use and the TTS model"""
+    with open(csv_filename, 'r', encoding='utf-8') as file:
+        voice_ids = sorted({row['voice_id'] for row in csv.DictReader(file)})
+    voices = {voice_id: voice_mapper.voice_map.get(voice_id) for voice_id in voice_ids}
+    return hash_json([hash_file(csv_filename), voices, MODEL_ID, chunk_duration_sec])
+
+def chunk_folder(output_filename: Union[str, Path]) -> Path:
+    """Where the chunks of an over-long lesson go: a folder of its own next to its mp3."""
+    output_filename = Path(output_filename)
+    return output_filename.parent / f"{output_filename.stem}_chunks"
+
+def cue_sheet_path(audio_filename: Union[str, Path]) -> Path:
+    """The cue sheet written next to an mp3, e.g. 01_01_dialogue_focus.cues.json"""
+    return Path(audio_filename).with_suffix('.cues.json')
+
+def write_cue_sheet(audio_filename: Union[str, Path], duration_ms: int, cues: List[Cue], **extra) -> Path:
+    """
+    Write the cue sheet of an mp3 atomically.
     
-    # Check cache first
-    cache_filename = cache_dir / get_cache_filename(text, elevenlabs_voice_id)
-    if cache_filename.exists():
-        AudioSegment.from_mp3(str(cache_filename)).export(output_filename, format="mp3")
-        print(f"Using cached audio for '{text}'")
-        return True
+    Args:
+        audio_filename: The mp3 the cues refer to
+        duration_ms: Total duration of the audio
+        cues: Row positions in playback order
+        extra: Further top-level fields (e.g. the chunk files of a split lesson)
+    
+    Returns:
+        Path of the cue sheet
+    """
+    path = cue_sheet_path(audio_filename)
+    sheet = {"audio": Path(audio_filename).name, "duration_ms": duration_ms, **extra, "cues": cues}
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(sheet, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def read_cue_sheet(audio_filename: Union[str, Path]) -> Optional[Dict]:
+    """Load the cue sheet of an mp3, or None if it has none."""
+    path = cue_sheet_path(audio_filename)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def rendered_output(output_filename: Union[str, Path]) -> Path:
+    """
+    What a lesson was last rendered to: its chunk folder if its cue sheet says it was
+    split, else the lesson mp3. This is the path the build manifest tracks.
+    """
+    output_filename = Path(output_filename)
+    try:
+        sheet = read_cue_sheet(output_filename)
+    except (OSError, ValueError):
+        sheet = None
+    if sheet is not None and sheet.get('chunks'):
+        return output_filename.parent / Path(sheet['chunks'][0]).parent
+    return output_filename
+
+def make_cue(entry: Dict[str, str], utterance: Utterance, repeat: int, delay: int, start: int, end: int, frame_rate: int) -> Cue:
+    return Cue(
+        order_id=int(entry['order_id']),
+        voice_id=entry['voice_id'],
+        text=entry['text'],
+        start_ms=int(round(start * 1000 / frame_rate)),
+        end_ms=int(round(end * 1000 / frame_rate)),
+        clip=clip_key(utterance),
+        repeat=repeat,
+        delay=delay,
+        start_frame=start,
+        end_frame=end
+    )
+
+def row_params(entry: Dict[str, str]) -> tuple:
+    """The repeat count and pause length (ms) of a CSV row"""
+    return int(entry.get('repeat', 1)), int(float(entry['delay']))
+
+class Placement(NamedTuple):
+    """A transcript row about to be placed: its length is known before any audio is written"""
+    entry: Dict[str, str]
+    utterance: Utterance
+    repeat: int
+    delay: int
+    frames: int
+    place: Callable[[PcmAssembler], Tuple[int, int]]  # Writes the row, returns its first and end frame
+
+def clip_placement(assembler: PcmAssembler, entry: Dict[str, str], utterance: Utterance, repeat: int, delay: int, clip_path: Path) -> Placement:
+    """Place a row from an audio file, measured now and decoded again from the pool when placed"""
+    frames = assembler.clip_frames(clip_path, repeat, delay)
+    return Placement(entry, utterance, repeat, delay, frames, lambda a: a.add_clip(clip_path, repeat, delay))
+
+def pcm_placement(assembler: PcmAssembler, entry: Dict[str, str], utterance: Utterance, repeat: int, delay: int, pcm: memoryview) -> Placement:
+    """Place a row from PCM already in the output format, repeat times with a pause of delay after each"""
+    frames = assembler.placement_frames(len(pcm) // assembler.frame_width, repeat, delay)
+    return Placement(entry, utterance, repeat, delay, frames, lambda a: a.add_pcm(pcm, repeat, delay))
+
+class LessonPatch(NamedTuple):
+    assembler: Optional[PcmAssembler]  # None when the audio did not change
+    placements: List[Placement]        # The rows to write, when it did
+    cues: List[Cue]                    # The refreshed cues, when it did not
+    pcm_format: List[int]
+
+def patch_lesson(
+    entries: List[Dict[str, str]],
+    output_filename: Union[str, Path],
+    voice_mapper: VoiceMapper,
+    max_workers: int = 4,
+    session: Optional[requests.Session] = None,
+    pcm_pool: Optional[PcmPool] = None,
+    cache_dir: str = "audio_cache"
+) -> Optional[LessonPatch]:
+    """
+    Rebuild a lesson from its previous render, synthesizing only rows whose audio is
+    not available yet.
     
-    # If not in cache, generate new audio
-    api_key = load_api_key()
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{elevenlabs_voice_id}"
+    The CSV rows are diffed against the cue sheet of the existing mp3 by (clip, repeat,
+    delay). Rows are taken from the audio cache where possible, which keeps the result
+    identical to a full render; rows whose clip is no longer cached are spliced from the
+    PCM of the existing mp3 (whole spans for unchanged rows, the bare clip for rows whose
+    repeat or delay changed). Only rows found in neither place are sent to ElevenLabs.
+    If no row changed, the audio is left alone and only the cue sheet is refreshed.
     
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": api_key
-    }
+    Returns:
+        The patch, or None if the mp3 has no usable cue sheet (or was split into chunks)
+    """
+    sheet = read_cue_sheet(output_filename)
+    if sheet is None or 'chunks' in sheet or 'pcm_format' not in sheet:
+        return None
+    old_cues = sheet['cues']
+    fmt = tuple(sheet['pcm_format'])
+    frame_rate, channels, sample_width = fmt
+    frame_width = channels * sample_width
     
-    data = {
-        "text": text,
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": voice_settings or {
-            "stability": 0.5,
-            "similarity_boost": 0.5
-        }
-    }
+    rows = [(entry, make_utterance(entry['text'], entry['voice_id'], voice_mapper), *row_params(entry)) for entry in entries]
+    new_sigs = [(clip_key(u), repeat, delay) for _, u, repeat, delay in rows]
+    old_sigs = [(c['clip'], c['repeat'], c['delay']) for c in old_cues]
+    
+    if new_sigs == old_sigs:
+        print("Audio unchanged, updating cue sheet only")
+        cues = [make_cue(entry, u, repeat, delay, old['start_frame'], old['end_frame'], frame_rate)
+                for (entry, u, repeat, delay), old in zip(rows, old_cues)]
+        return LessonPatch(None, [], cues, list(fmt))
+    
+    opcodes = SequenceMatcher(a=old_sigs, b=new_sigs, autojunk=False).get_opcodes()
+    changed = sum(j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+    print(f"{changed} of {len(rows)} rows changed since the last render (which had {len(old_cues)} rows)")
+    
+    old_by_clip = {c['clip']: c for c in old_cues}
+    missing = [entry for entry, u, _, _ in rows
+               if not get_cache_path(u, cache_dir).exists() and clip_key(u) not in old_by_clip]
+    if missing and not synthesize_missing(missing, voice_mapper, cache_dir, max_workers, session):
+        raise RuntimeError("could not synthesize the changed rows")
+    
+    old_pcm: Optional[memoryview] = None
+    
+    def old_audio() -> memoryview:
+        # Decoded on first use only: usually every clip is still cached. Rows are
+        # sliced from a view, so splicing them copies nothing.
+        nonlocal old_pcm
+        if old_pcm is None:
+            segment = match_format(AudioSegment.from_file(str(output_filename)), *fmt)
+            old_pcm = memoryview(segment.raw_data)
+            expected = old_cues[-1]['end_frame'] if old_cues else 0
+            if abs(len(old_pcm) // frame_width - expected) > frame_rate // 10:
+                raise RuntimeError(f"{output_filename} does not match its cue sheet")
+        return old_pcm
+    
+    def old_clip(cue: Cue) -> memoryview:
+        # A span is repeat x (clip + pause); recover the bare clip from the first repetition
+        pause = int(round(cue['delay'] * frame_rate / 1000)) if cue['delay'] > 0 else 0
+        clip_frames = (cue['end_frame'] - cue['start_frame']) // max(cue['repeat'], 1) - pause
+        return old_audio()[cue['start_frame'] * frame_width:(cue['start_frame'] + clip_frames) * frame_width]
+    
+    assembler = PcmAssembler(*fmt, pool=pcm_pool)
+    placements: List[Placement] = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        for offset, j in enumerate(range(j1, j2)):
+            entry, utterance, repeat, delay = rows[j]
+            cache_path = get_cache_path(utterance, cache_dir)
+            if cache_path.exists():
+                placements.append(clip_placement(assembler, entry, utterance, repeat, delay, cache_path))
+            elif tag == 'equal':
+                # The whole span of an unchanged row, pauses included
+                old = old_cues[i1 + offset]
+                span = old_audio()[old['start_frame'] * frame_width:old['end_frame'] * frame_width]
+                placements.append(Placement(entry, utterance, repeat, delay, len(span) // frame_width,
+                                            lambda a, span=span: a.add_pcm(span)))
+            else:
+                clip = old_clip(old_by_clip[clip_key(utterance)])
+                placements.append(pcm_placement(assembler, entry, utterance, repeat, delay, clip))
+    return LessonPatch(assembler, placements, [], list(fmt))
 
-    try:
-        response = requests.post(url, json=data, headers=headers)
-        
-        if response.status_code == 200:
-            # Save to cache
-            cache_filename.write_bytes(response.content)
-            # Copy to output filename
-            Path(output_filename).write_bytes(response.content)
-            print(f"Audio file generated and cached as '{cache_filename}'")
-            return True
+def export_lesson(assembler: PcmAssembler, placements: List[Placement], output_filename, chunk_duration_sec: int = 600, output_folder: Optional[str] = None) -> None:
+    """
+    Encode a lesson (split into chunks if too long) and write its cue sheet.
+    
+    The length of every row is known before any audio is written, so the lesson is
+    split or not up front and each row goes straight into the encoder as it is placed.
+    """
+    max_duration_ms = chunk_duration_sec * 1000
+    duration_ms = assembler.frames_to_ms(sum(p.frames for p in placements))
+    chunked = duration_ms > max_duration_ms
+    cues: List[Cue] = []
+    with make_scratch_dir() as scratch:
+        if chunked:
+            print("Audio file exceeds size limit. Splitting into smaller chunks...")
+            output_folder = output_folder or str(chunk_folder(output_filename))
+            writer = ChunkedMp3Writer(output_folder, max_duration_ms, *assembler.fmt, scratch_dir=scratch)
         else:
-            print(f"Error: {response.status_code}")
-            print(response.text)
-            return False
-            
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        return False
+            writer = Mp3StreamWriter(output_filename, *assembler.fmt, scratch_dir=scratch)
+        with writer:
+            assembler.open(writer)
+            for placement in placements:
+                start, end = placement.place(assembler)
+                cues.append(make_cue(placement.entry, placement.utterance, placement.repeat, placement.delay,
+                                     start, end, assembler.frame_rate))
+    
+    if chunked:
+        print(f"Audio split into {len(writer.chunks)} chunks, saved in '{output_folder}'")
+        # Cue times stay relative to the whole lesson; chunk n starts at (n - 1) * chunk_duration_ms
+        write_cue_sheet(output_filename, assembler.duration_ms, cues, pcm_format=list(assembler.fmt),
+                        chunks=[os.path.relpath(c, Path(output_filename).parent) for c in writer.chunks],
+                        chunk_duration_ms=max_duration_ms)
+    else:
+        print(f"Final audio saved as '{output_filename}'")
+        write_cue_sheet(output_filename, assembler.duration_ms, cues, pcm_format=list(assembler.fmt))
 
-def split_audio_file(audio, chunk_duration_ms, output_folder):
-    """Split audio into smaller chunks"""
-    output_folder = Path(output_folder)
-    output_folder.mkdir(exist_ok=True)
-    
-    chunks = []
-    for i, start in enumerate(range(0, len(audio), chunk_duration_ms)):
-        end = start + chunk_duration_ms
-        chunk = audio[start:end]
-        chunk_filename = output_folder / f"chunk_{i + 1}.mp3"
-        chunk.export(str(chunk_filename), format="mp3")
-        chunks.append(str(chunk_filename))
-    return chunks
-
-def process_csv_to_audio(csv_filename, output_filename, chunk_duration_sec=600, test_mode=False):
-    """Process a CSV file and create a combined audio file with handling for large files"""
-    if os.path.exists(output_filename) and not test_mode:
+@metrics.traced("audio.process_csv")
+def process_csv_to_audio(csv_filename, output_filename, chunk_duration_sec=600, test_mode=False, overwrite=False, max_workers=4, pcm_pool: Optional[PcmPool] = None, output_folder: Optional[str] = None, patch: bool = False, prefetched: bool = False):
+    """
+    Process a CSV file and create a combined audio file with handling for large files.
+    Uncached rows are synthesized concurrently (up to max_workers requests at a time)
+    before the lesson is assembled in order_id order. Pass the same pcm_pool for every
+    CSV of a run to decode shared clips and build pauses and repeats only once.
+    Lessons longer than chunk_duration_sec are split into output_folder, by default
+    a folder named after the lesson next to output_filename. Encoder output is staged
+    in a private scratch directory (tmpfs where available) and moved into place.
+    A cue sheet with the position of every row is written next to output_filename.
+    With patch, an existing mp3 is updated from its cue sheet (see patch_lesson).
+    Pass prefetched when prefetch_course_audio already looked the rows up, so the
+    audio cache metrics count each lookup once.
+    """
+    if os.path.exists(output_filename) and not test_mode and not overwrite:
         print(f"Skipping {output_filename} - file already exists")
         return True
     
-    temp_files = []
-    output_folder = "output_chunks"
-    os.makedirs(output_folder, exist_ok=True)
-    
     # Initialize voice mapper
     voice_mapper = VoiceMapper()
     print("Loaded voice configurations:")
@@ -186,9 +686,8 @@ def process_csv_to_audio(csv_filename, output_filename, chunk_duration_sec=600,
     
     try:
         # Read CSV and sort by order_id
-        with open(csv_filename, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            entries = sorted(reader, key=lambda x: int(x['order_id']))
+        entries = read_transcript(csv_filename)
+        metrics.annotate(csv=Path(csv_filename).name, rows=len(entries))
         
         if not entries:
             print("CSV file is empty")
@@ -210,79 +709,56 @@ def process_csv_to_audio(csv_filename, output_filename, chunk_duration_sec=600,
             print(f"Test mode: Created summary file at {output_path}")
             return True
         
-        combined = AudioSegment.silent(duration=0)
+        # The TTS session (and API key) is only needed once a clip turns out to be missing
+        if patch and os.path.exists(output_filename):
+            patched = patch_lesson(entries, output_filename, voice_mapper, max_workers, pcm_pool=pcm_pool)
+            if patched is not None and patched.assembler is None:
+                write_cue_sheet(output_filename, read_cue_sheet(output_filename)['duration_ms'], patched.cues,
+                                pcm_format=patched.pcm_format)
+                return True
+            if patched is not None:
+                export_lesson(patched.assembler, patched.placements, output_filename, chunk_duration_sec, output_folder)
+                return True
+            print("No usable cue sheet for the existing audio, rendering every row")
         
-        # Process each entry
-        for i, entry in enumerate(entries):
-            temp_filename = f"temp_{i}.mp3"
-            temp_files.append(temp_filename)
-            
-            # Generate speech with voice mapper
-            if not generate_speech(
-                entry['text'], 
-                entry['voice_id'], 
-                temp_filename,
-                voice_mapper,
-                test_mode=test_mode
-            ):
-                return False
-            
-            if not test_mode:
-                # Load the audio segment
-                current_segment = AudioSegment.from_mp3(temp_filename)
-                
-                # Add the segment the number of times specified in the repeat column
-                repeat_count = int(entry.get('repeat', 1))
-                for _ in range(repeat_count):
-                    combined += current_segment
-                    
-                    # Add pause after each repetition
-                    pause_duration = int(float(entry['delay']))
-                    if pause_duration > 0:
-                        combined += AudioSegment.silent(duration=pause_duration)
+        if not synthesize_missing(entries, voice_mapper, max_workers=max_workers, count_lookups=not prefetched):
+            return False
         
-        if not test_mode:
-            # Check total duration for splitting
-            max_duration_ms = chunk_duration_sec * 1000
-            if len(combined) > max_duration_ms:
-                print("Audio file exceeds size limit. Splitting into smaller chunks...")
-                chunks = split_audio_file(combined, max_duration_ms, output_folder)
-                print(f"Audio split into {len(chunks)} chunks, saved in '{output_folder}'")
-            else:
-                combined.export(output_filename, format="mp3")
-                print(f"Final audio saved as '{output_filename}'")
+        # Each distinct clip is decoded once; rows are measured first, then streamed
+        # into the encoder one at a time
+        assembler = PcmAssembler(pool=pcm_pool)
+        placements: List[Placement] = []
+        
+        # Process each entry; synthesize_missing has put every clip in the cache
+        for entry in entries:
+            utterance = make_utterance(entry['text'], entry['voice_id'], voice_mapper)
+            
+            # Add the clip the number of times specified in the repeat column,
+            # with a pause after each repetition
+            repeat, delay = row_params(entry)
+            placements.append(clip_placement(assembler, entry, utterance, repeat, delay, get_cache_path(utterance)))
         
+        export_lesson(assembler, placements, output_filename, chunk_duration_sec, output_folder)
         return True
         
     except Exception as e:
         print(f"Error processing CSV: {str(e)}")
         return False
-        
-    finally:
-        # Clean up temporary files
-        if not test_mode:
-            for temp_file in temp_files:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
 
-def process_directory(base_path: str, part: str = None, lesson: str = None, chunk_duration_sec: int = 600, test_mode: bool = False) -> bool:
+def collect_audio_jobs(
+    base_dir: Path,
+    part: str = None,
+    lesson: str = None,
+    chunk_duration_sec: int = 600,
+    test_mode: bool = False,
+    manifest: Optional[BuildManifest] = None,
+    voice_mapper: Optional[VoiceMapper] = None
+) -> List[AudioJob]:
     """
-    Process CSV files in the specified directory structure.
-    
-    Args:
-        base_path: Base path to the language directory (e.g., 'danish')
-        part: Specific part to process (e.g., 'part_01'). If None, processes all parts
-        lesson: Specific lesson to process (e.g., 'lesson_01'). If None, processes all lessons
-        chunk_duration_sec: Maximum duration for audio chunks in seconds
-        test_mode: If True, generates text files instead of audio files
-    
-    Returns:
-        bool: True if processing was successful, False otherwise
+    Find the transcript CSVs to render, skipping those whose mp3 is up to date.
+    See process_directory for the arguments.
     """
-    base_dir = Path(base_path)
-    if not base_dir.exists():
-        print(f"Error: Directory {base_path} does not exist")
-        return False
+    jobs = []
     
     # Determine which parts to process
     if part:
@@ -314,31 +790,176 @@ def process_directory(base_path: str, part: str = None, lesson: str = None, chun
                 print(f"Warning: No CSV files found in {transcript_dir}")
                 continue
             
+            # Create output directory if it doesn't exist
+            output_dir = lesson_dir / 'audio'
+            output_dir.mkdir(exist_ok=True)
+            
             for csv_file in sorted(csv_files):
-                print(f"\nProcessing {csv_file.name}...")
-                
-                # Create output directory if it doesn't exist
-                output_dir = lesson_dir / 'audio'
-                output_dir.mkdir(exist_ok=True)
-                
                 # Generate output filename
                 output_filename = output_dir / f"{csv_file.stem}.mp3"
                 
-                # Process the CSV file
-                success = process_csv_to_audio(
-                    str(csv_file),
-                    str(output_filename),
-                    chunk_duration_sec,
-                    test_mode=test_mode
-                )
-                
-                if not success:
-                    print(f"Error processing {csv_file.name}")
+                # A lesson that was split into chunks has no mp3 of its own
+                rendered = rendered_output(output_filename)
+                input_hash = None
+                if manifest is not None and not test_mode:
+                    try:
+                        input_hash = audio_input_hash(csv_file, voice_mapper, chunk_duration_sec)
+                    except Exception as e:
+                        print(f"Warning: Skipping {csv_file} - could not read transcript: {str(e)}")
+                        continue
+                    if not manifest.is_stale(rendered, input_hash):
+                        print(f"Skipping {rendered} - up to date")
+                        continue
+                elif rendered.exists() and not test_mode:
+                    print(f"Skipping {rendered} - file already exists")
                     continue
+                
+                jobs.append(AudioJob(csv_file, output_filename, input_hash))
+    
+    return jobs
+
+def process_directory(
+    base_path: str,
+    part: str = None,
+    lesson: str = None,
+    chunk_duration_sec: int = 600,
+    test_mode: bool = False,
+    manifest: Optional[BuildManifest] = None,
+    max_workers: int = 4,
+    prefetch: bool = True,
+    processes: int = 1,
+    patch: bool = False
+) -> bool:
+    """
+    Process CSV files in the specified directory structure.
+    
+    Args:
+        base_path: Base path to the language directory (e.g., 'danish')
+        part: Specific part to process (e.g., 'part_01'). If None, processes all parts
+        lesson: Specific lesson to process (e.g., 'lesson_01'). If None, processes all lessons
+        chunk_duration_sec: Maximum duration for audio chunks in seconds
+        test_mode: If True, generates text files instead of audio files
+        manifest: Build manifest; existing mp3s are rebuilt when their CSV rows or
+            voice settings changed. Without it, existing mp3s are always skipped
+        max_workers: Maximum number of concurrent TTS requests
+        prefetch: Synthesize the distinct utterances of all selected CSVs up front,
+            so phrases shared between transcripts are requested only once
+        processes: Number of worker processes decoding and encoding lessons in parallel
+        patch: Update existing mp3s from their cue sheets, synthesizing only rows
+            whose audio is neither cached nor in the previous render
+    
+    Returns:
+        bool: True if processing was successful, False otherwise
+    """
+    base_dir = Path(base_path)
+    if not base_dir.exists():
+        print(f"Error: Directory {base_path} does not exist")
+        return False
+    
+    voice_mapper = VoiceMapper()
+    jobs = collect_audio_jobs(base_dir, part, lesson, chunk_duration_sec, test_mode, manifest, voice_mapper)
+    
+    prefetched = prefetch and not test_mode and bool(jobs)
+    if prefetched:
+        reusable = set()
+        if patch:
+            for job in jobs:
+                sheet = read_cue_sheet(job.output_filename) if job.output_filename.exists() else None
+                if sheet is not None and 'chunks' not in sheet:
+                    reusable.update(cue['clip'] for cue in sheet['cues'] if 'clip' in cue)
+        synthesized, unreadable = prefetch_course_audio(
+            [job.csv_file for job in jobs], voice_mapper, max_workers=max_workers, reusable=reusable
+        )
+        if not synthesized:
+            print("Warning: some utterances could not be synthesized")
+        if unreadable:
+            print(f"Skipping {len(unreadable)} unreadable transcripts")
+            jobs = [job for job in jobs if job.csv_file not in unreadable]
+    
+    def finish(job: AudioJob, success: bool) -> None:
+        if not success:
+            print(f"Error processing {job.csv_file.name}")
+            return
+        if job.input_hash is not None:
+            manifest.record(rendered_output(job.output_filename), job.input_hash)
+            manifest.save()
     
+    if processes > 1 and len(jobs) > 1:
+        # Decoding and encoding are CPU bound, so spread the lessons over processes.
+        # Every job writes only to its own output file, chunk folder and scratch directory.
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_audio_worker) as pool:
+            futures = {
+                pool.submit(_render_audio_job, job, chunk_duration_sec, test_mode, max_workers, patch, prefetched): job
+                for job in jobs
+            }
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    success = future.result()
+                except Exception as e:
+                    print(f"Error processing {job.csv_file.name}: {e}")
+                    success = False
+                finish(job, success)
+        return True
+    
+    # Decoded clips, pauses and repeats are shared by every lesson in this run
+    pcm_pool = PcmPool()
+    
+    for job in jobs:
+        print(f"\nProcessing {job.csv_file.name}...")
+        
+        # Process the CSV file
+        success = process_csv_to_audio(
+            str(job.csv_file),
+            str(job.output_filename),
+            chunk_duration_sec,
+            test_mode=test_mode,
+            overwrite=True,
+            max_workers=max_workers,
+            pcm_pool=pcm_pool,
+            patch=patch,
+            prefetched=prefetched
+        )
+        finish(job, success)
+    
+    pcm_pool.report()
     return True
 
-def combine_daily_audio(lesson_dir: Path, day_number: str, test_mode: bool = False) -> bool:
+def _init_audio_worker() -> None:
+    """Give each worker process its own TTS connections and PCM pool."""
+    global _shared_session, _shared_session_workers, _session_lock, _tts_rate_limiter, _worker_pcm_pool
+    _shared_session = None
+    _shared_session_workers = 0
+    _tts_rate_limiter = None
+    _session_lock = threading.Lock()
+    _worker_pcm_pool = PcmPool()
+
+def _render_audio_job(job: AudioJob, chunk_duration_sec: int, test_mode: bool, max_workers: int, patch: bool = False, prefetched: bool = False) -> bool:
+    print(f"\nProcessing {job.csv_file.name}...")
+    return process_csv_to_audio(
+        str(job.csv_file),
+        str(job.output_filename),
+        chunk_duration_sec,
+        test_mode=test_mode,
+        overwrite=True,
+        max_workers=max_workers,
+        pcm_pool=_worker_pcm_pool,
+        patch=patch,
+        prefetched=prefetched
+    )
+
+def find_day_files(lesson_dir: Path, day_number: str) -> List[Path]:
+    """The section mp3s of one day, in section order."""
+    day_files = list((lesson_dir / 'audio').glob(f"{day_number}_[0-9][0-9]_*.mp3"))
+    # Sort files by the second number (section number)
+    day_files.sort(key=lambda x: x.stem.split('_')[1])
+    return day_files
+
+def combined_day_path(lesson_dir: Path, day_number: str) -> Path:
+    return lesson_dir / 'combined_audio' / f"day_{day_number}_combined.mp3"
+
+@metrics.traced("audio.combine_day")
+def combine_daily_audio(lesson_dir: Path, day_number: str, test_mode: bool = False, manifest: Optional[BuildManifest] = None) -> bool:
     """
     Combine all audio files for a specific day in a lesson into a single file.
     
@@ -346,6 +967,7 @@ def combine_daily_audio(lesson_dir: Path, day_number: str, test_mode: bool = Fal
         lesson_dir: Path to the lesson directory
         day_number: The day number as a two-digit string (e.g., '01', '02')
         test_mode: If True, creates a text summary instead of combining audio
+        manifest: Build manifest; the combined file is only rebuilt when the day's mp3s changed
     
     Returns:
         bool: True if combination was successful, False otherwise
@@ -357,15 +979,12 @@ def combine_daily_audio(lesson_dir: Path, day_number: str, test_mode: bool = Fal
             return False
             
         # Find all audio files for the specified day
-        day_pattern = f"{day_number}_[0-9][0-9]_*.mp3"
-        day_files = list(audio_dir.glob(day_pattern))
+        day_files = find_day_files(lesson_dir, day_number)
+        metrics.annotate(lesson=str(lesson_dir), day=day_number, files=len(day_files))
         
         if not day_files:
             print(f"No audio files found for day {day_number} in {audio_dir}")
             return False
-            
-        # Sort files by the second number (section number)
-        day_files.sort(key=lambda x: x.stem.split('_')[1])
         
         print(f"Found {len(day_files)} audio files for day {day_number}:")
         for file in day_files:
@@ -388,21 +1007,27 @@ def combine_daily_audio(lesson_dir: Path, day_number: str, test_mode: bool = Fal
             return True
             
         else:
-            # Create the combined audio
-            combined = AudioSegment.empty()
-            for audio_file in day_files:
-                print(f"Adding {audio_file.name}")
-                segment = AudioSegment.from_mp3(str(audio_file))
-                combined += segment
-                
+            output_filename = combined_day_path(lesson_dir, day_number)
+            combined_dir = output_filename.parent
+            input_hash = hash_files(day_files) if manifest is not None else None
+            if input_hash is not None and not manifest.is_stale(output_filename, input_hash):
+                print(f"Skipping {output_filename} - up to date")
+                return True
+            
             # Create combined directory if it doesn't exist
-            combined_dir = lesson_dir / 'combined_audio'
             combined_dir.mkdir(exist_ok=True)
             
-            # Export combined file
-            output_filename = combined_dir / f"day_{day_number}_combined.mp3"
-            combined.export(str(output_filename), format="mp3")
+            # Join the mp3 frames directly; only mismatched inputs are re-encoded
+            for audio_file in day_files:
+                print(f"Adding {audio_file.name}")
+            with make_scratch_dir() as scratch:
+                offsets = concat_audio(day_files, output_filename, scratch_dir=scratch)
             print(f"Created combined audio file: {output_filename}")
+            write_day_cue_sheet(output_filename, day_files, offsets)
+            
+            if input_hash is not None:
+                manifest.record(output_filename, input_hash)
+                manifest.save()
             
             return True
         
@@ -410,7 +1035,111 @@ def combine_daily_audio(lesson_dir: Path, day_number: str, test_mode: bool = Fal
         print(f"Error combining audio files: {str(e)}")
         return False
 
-def combine_lesson_audio(base_path: str, part: str, lesson: str, test_mode: bool = False) -> bool:
+def find_day_numbers(lesson_dir: Path) -> List[str]:
+    """The day numbers of a lesson, taken from its daily transcript names (e.g. ['01', '02'])."""
+    # Look at the daily_transcripts directory to determine which days exist
+    transcript_dir = lesson_dir / 'daily_transcripts'
+    if not transcript_dir.exists():
+        print(f"Error: daily_transcripts directory not found in {lesson_dir}")
+        return []
+        
+    # Get unique day numbers from CSV files
+    day_numbers = set()
+    for csv_file in transcript_dir.glob("*.csv"):
+        # Extract the day number (first two digits)
+        day_num = csv_file.stem.split('_')[0]
+        if len(day_num) == 2 and day_num.isdigit():
+            day_numbers.add(day_num)
+    
+    if not day_numbers:
+        print(f"No day numbers found in {transcript_dir}")
+    return sorted(day_numbers)
+
+def combine_days(
+    days: List[tuple],
+    test_mode: bool = False,
+    manifest: Optional[BuildManifest] = None,
+    processes: int = 1
+) -> bool:
+    """
+    Combine the audio of several (lesson_dir, day_number) pairs.
+    
+    Args:
+        days: (lesson directory, day number) pairs to combine
+        test_mode: If True, creates text summaries instead of combining audio
+        manifest: Build manifest; only days whose mp3s changed are recombined
+        processes: Number of worker processes combining days in parallel
+    
+    Returns:
+        bool: True if all combinations were successful, False otherwise
+    """
+    if processes <= 1 or len(days) <= 1:
+        success = True
+        for lesson_dir, day_num in days:
+            print(f"\nProcessing day {day_num} of {lesson_dir}...")
+            if not combine_daily_audio(lesson_dir, day_num, test_mode, manifest=manifest):
+                print(f"Failed to combine audio for day {day_num}")
+                success = False
+        return success
+    
+    # The manifest stays in this process: check staleness here, build in the workers,
+    # and record the days that succeeded
+    pending = {}
+    for lesson_dir, day_num in days:
+        input_hash = None
+        if manifest is not None and not test_mode:
+            day_files = find_day_files(lesson_dir, day_num)
+            input_hash = hash_files(day_files)
+            output_filename = combined_day_path(lesson_dir, day_num)
+            if day_files and not manifest.is_stale(output_filename, input_hash):
+                print(f"Skipping {output_filename} - up to date")
+                continue
+        pending[(lesson_dir, day_num)] = input_hash
+    
+    success = True
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {
+            pool.submit(combine_daily_audio, lesson_dir, day_num, test_mode): (lesson_dir, day_num)
+            for lesson_dir, day_num in pending
+        }
+        for future in as_completed(futures):
+            lesson_dir, day_num = futures[future]
+            if not future.result():
+                print(f"Failed to combine audio for day {day_num} of {lesson_dir}")
+                success = False
+            elif pending[(lesson_dir, day_num)] is not None:
+                manifest.record(combined_day_path(lesson_dir, day_num), pending[(lesson_dir, day_num)])
+    if manifest is not None:
+        manifest.save()
+    return success
+
+def write_day_cue_sheet(output_filename: Path, day_files: List[Path], offsets: List[int]) -> Path:
+    """
+    Merge the cue sheets of a day's sections into one for the combined file,
+    shifting every cue by the offset of its section. Sections without a cue
+    sheet (rendered before cue sheets existed) are listed without cues.
+    """
+    sections = []
+    cues = []
+    duration_ms = 0
+    for audio_file, offset in zip(day_files, offsets):
+        sheet = read_cue_sheet(audio_file)
+        sections.append({"section": audio_file.stem, "start_ms": offset})
+        if sheet is None:
+            duration_ms = offset + audio_duration_ms(audio_file)
+            continue
+        duration_ms = offset + sheet["duration_ms"]
+        for cue in sheet["cues"]:
+            # Frame positions are only meaningful within the section's own file
+            cues.append({
+                **{k: v for k, v in cue.items() if k not in ("start_frame", "end_frame")},
+                "section": audio_file.stem,
+                "start_ms": cue["start_ms"] + offset,
+                "end_ms": cue["end_ms"] + offset
+            })
+    return write_cue_sheet(output_filename, duration_ms, cues, sections=sections)
+
+def combine_lesson_audio(base_path: str, part: str, lesson: str, test_mode: bool = False, manifest: Optional[BuildManifest] = None, processes: int = 1) -> bool:
     """
     Combine audio files for all days in a specific lesson.
     
@@ -419,6 +1148,8 @@ def combine_lesson_audio(base_path: str, part: str, lesson: str, test_mode: bool
         part: Part identifier (e.g., 'part_01')
         lesson: Lesson identifier (e.g., 'lesson_01')
         test_mode: If True, creates text summaries instead of combining audio
+        manifest: Build manifest; only days whose mp3s changed are recombined
+        processes: Number of worker processes combining days in parallel
     
     Returns:
         bool: True if all combinations were successful, False otherwise
@@ -430,48 +1161,67 @@ def combine_lesson_audio(base_path: str, part: str, lesson: str, test_mode: bool
         if not lesson_dir.exists():
             print(f"Error: Lesson directory {lesson_dir} does not exist")
             return False
-            
-        # Look at the daily_transcripts directory to determine which days exist
-        transcript_dir = lesson_dir / 'daily_transcripts'
-        if not transcript_dir.exists():
-            print(f"Error: daily_transcripts directory not found in {lesson_dir}")
-            return False
-            
-        # Get unique day numbers from CSV files
-        day_numbers = set()
-        for csv_file in transcript_dir.glob("*.csv"):
-            # Extract the day number (first two digits)
-            day_num = csv_file.stem.split('_')[0]
-            if len(day_num) == 2 and day_num.isdigit():
-                day_numbers.add(day_num)
         
+        day_numbers = find_day_numbers(lesson_dir)
         if not day_numbers:
-            print(f"No day numbers found in {transcript_dir}")
             return False
 
         if test_mode:
             print(f"Running in test mode - will create text summaries instead of audio files")
             
         # Process each day
-        success = True
-        for day_num in sorted(day_numbers):
-            print(f"\nProcessing day {day_num}...")
-            if not combine_daily_audio(lesson_dir, day_num, test_mode):
-                print(f"Failed to combine audio for day {day_num}")
-                success = False
-                
-        return success
+        return combine_days([(lesson_dir, day_num) for day_num in day_numbers], test_mode, manifest, processes)
         
     except Exception as e:
         print(f"Error in combine_lesson_audio: {str(e)}")
         return False
 
+def combine_directory(base_path: str, part: str = None, lesson: str = None, test_mode: bool = False, manifest: Optional[BuildManifest] = None, processes: int = 1) -> bool:
+    """
+    Combine the daily audio of every selected lesson, sharing one pool of workers
+    between all their days. Arguments as for process_directory.
+    """
+    base_dir = Path(base_path)
+    if not base_dir.exists():
+        print(f"Error: Directory {base_path} does not exist")
+        return False
+    
+    parts = [base_dir / part] if part else sorted(p for p in base_dir.iterdir() if p.is_dir() and p.name.startswith('part_'))
+    days = []
+    for part_dir in parts:
+        lessons = [part_dir / lesson] if lesson else sorted(l for l in part_dir.iterdir() if l.is_dir() and l.name.startswith('lesson_'))
+        for lesson_dir in lessons:
+            days.extend((lesson_dir, day_num) for day_num in find_day_numbers(lesson_dir))
+    return combine_days(days, test_mode, manifest, processes)
+
 # Update your main block to include the new functionality
 if __name__ == "__main__":
-    # Test mode examples
-    #process_directory("danish", "part_01", test_mode=True)
-    #combine_lesson_audio("danish", "part_01", "lesson_01", test_mode=True)
-
-    # Normal mode examples
-    process_directory("danish", "part_06", test_mode=False)
-    combine_lesson_audio("danish", "part_06", "lesson_01")
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Render daily transcripts to audio and combine each day into one file')
+    parser.add_argument('--base-dir', default='danish', help='Base directory of the course')
+    parser.add_argument('--part', default='part_06', help='Part to process (e.g. part_01); "all" for every part')
+    parser.add_argument('--lesson', help='Lesson to process (e.g. lesson_01); all lessons of the part by default')
+    parser.add_argument('--test', action='store_true', help='Write text summaries instead of audio')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for rendering lessons and combining days')
+    parser.add_argument('--tts-workers', type=int, default=4, help='Concurrent text-to-speech requests')
+    parser.add_argument('--no-manifest', action='store_true', help='Skip existing files instead of rebuilding those whose inputs changed')
+    parser.add_argument('--patch', action='store_true', help='Update changed lessons from their cue sheets instead of rendering every row')
+    parser.add_argument('--base-url', default=None, help='ElevenLabs API base URL, e.g. a local stub server')
+    parser.add_argument('--metrics', help='Append timings, TTS usage and cache counts to this JSONL file and print a summary')
+    
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.configure(args.metrics)
+    if args.base_url:
+        # Set in the environment so worker processes use it too
+        os.environ['ELEVENLABS_BASE_URL'] = args.base_url
+    part = None if args.part == 'all' else args.part
+    
+    # The manifest rebuilds only audio whose inputs changed
+    manifest = None if args.no_manifest else BuildManifest(args.base_dir)
+    process_directory(args.base_dir, part, args.lesson, test_mode=args.test, manifest=manifest,
+                      max_workers=args.tts_workers, processes=args.workers, patch=args.patch)
+    combine_directory(args.base_dir, part, args.lesson, test_mode=args.test, manifest=manifest,
+                      processes=args.workers)
+    metrics.report()
@@ -0,0 +1,79 @@
+import json
+
+from build_manifest import BuildManifest, hash_files, hash_json
+
+def write(path, text="x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return path
+
+def test_missing_output_is_stale(tmp_path):
+    manifest = BuildManifest(tmp_path)
+    assert manifest.is_stale(tmp_path / "missing.mp3", "h")
+
+def test_untracked_output_is_adopted(tmp_path):
+    output = write(tmp_path / "part_01" / "a.csv")
+    manifest = BuildManifest(tmp_path)
+    assert not manifest.is_stale(output, "h1")
+    manifest.save()
+    assert json.loads(manifest.path.read_text()) == {"part_01/a.csv": "h1"}
+    assert BuildManifest(tmp_path).is_stale(output, "h2")
+
+def test_untracked_output_is_stale_without_adoption(tmp_path):
+    output = write(tmp_path / "plan.json")
+    manifest = BuildManifest(tmp_path, adopt_untracked=False)
+    assert manifest.is_stale(output, "h1")
+    manifest.save()
+    assert not manifest.path.exists()
+
+def test_recorded_hash_decides_staleness(tmp_path):
+    output = write(tmp_path / "a.mp3")
+    manifest = BuildManifest(tmp_path)
+    manifest.record(output, "h1")
+    manifest.save()
+
+    reloaded = BuildManifest(tmp_path)
+    assert not reloaded.is_stale(output, "h1")
+    assert reloaded.is_stale(output, "h2")
+    output.unlink()
+    assert reloaded.is_stale(output, "h1")
+
+def test_directory_outputs_are_tracked(tmp_path):
+    chunks = tmp_path / "audio" / "lesson_chunks"
+    write(chunks / "chunk_1.mp3")
+    manifest = BuildManifest(tmp_path, adopt_untracked=False)
+    manifest.record(chunks, "h1")
+    manifest.save()
+    assert json.loads(manifest.path.read_text()) == {"audio/lesson_chunks": "h1"}
+    assert not BuildManifest(tmp_path, adopt_untracked=False).is_stale(chunks, "h1")
+
+def test_save_merges_concurrent_manifests(tmp_path):
+    first, second = BuildManifest(tmp_path), BuildManifest(tmp_path)
+    first.record(write(tmp_path / "a"), "ha")
+    second.record(write(tmp_path / "b"), "hb")
+    first.save()
+    second.save()
+    assert json.loads(first.path.read_text()) == {"a": "ha", "b": "hb"}
+    assert second.entries == {"a": "ha", "b": "hb"}
+
+def test_save_without_changes_writes_nothing(tmp_path):
+    BuildManifest(tmp_path).save()
+    assert not (tmp_path / ".build_manifest.json").exists()
+
+def test_outputs_outside_base_dir_use_absolute_keys(tmp_path):
+    output = write(tmp_path / "elsewhere" / "a.mp3")
+    manifest = BuildManifest(tmp_path / "course")
+    manifest.record(output, "h")
+    assert manifest.entries == {output.resolve().as_posix(): "h"}
+
+def test_hash_json_ignores_key_order():
+    assert hash_json({"a": 1, "b": [1, "æ"]}) == hash_json({"b": [1, "æ"], "a": 1})
+    assert hash_json({"a": 1}) != hash_json({"a": 2})
+
+def test_hash_files_covers_names_and_contents(tmp_path):
+    a, b = write(tmp_path / "a", "1"), write(tmp_path / "b", "1")
+    assert hash_files([a]) != hash_files([b])
+    before = hash_files([a, b])
+    assert hash_files([b, a]) != before
+    write(b, "2")
+    assert hash_files([a, b]) != before
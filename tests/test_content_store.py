@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+import content_store
+from content_store import ContentStore, scan_content_config
+
+CONFIG = {
+    "course": "Dansk for begyndere",
+    "lessons": [
+        {"lesson_number": 1.1, "title": "Hvad hedder du?", "target_phrases": ["Jeg hedder Søren"]},
+        {"lesson_number": 1.2, "title": "Æbler og pærer", "target_phrases": ["Må jeg få en øl?"]},
+        {"lesson_number": 2.1, "title": "På café", "target_phrases": ["Én kaffe, tak"]},
+    ],
+    "levels": {"A1": "Begynder"},
+}
+
+def write_config(path, config, bom=False, indent=2):
+    text = json.dumps(config, ensure_ascii=False, indent=indent)
+    path.write_bytes((b"\xef\xbb\xbf" if bom else b"") + text.encode("utf-8"))
+    return path
+
+@pytest.mark.parametrize("bom", [False, True])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_lessons_round_trip(tmp_path, bom, indent):
+    path = write_config(tmp_path / "content.json", CONFIG, bom, indent)
+    store = ContentStore(path)
+    assert store.lesson_numbers() == [1.1, 1.2, 2.1]
+    assert len(store) == 3 and 1.2 in store and 3.1 not in store
+    assert store.header == {"course": CONFIG["course"], "levels": CONFIG["levels"]}
+    assert store.lesson(1.2) == CONFIG["lessons"][1]
+    assert store.config() == CONFIG
+    assert store.config([2.1, 1.1]) == {**CONFIG, "lessons": [CONFIG["lessons"][2], CONFIG["lessons"][0]]}
+
+def test_index_is_reused(tmp_path, monkeypatch):
+    path = write_config(tmp_path / "content.json", CONFIG)
+    ContentStore(path)
+    assert (tmp_path / "content.json.index.json").exists()
+
+    def rescan(text):
+        raise AssertionError("index should have been reused")
+    monkeypatch.setattr(content_store, "scan_content_config", rescan)
+    assert ContentStore(path).lesson(2.1) == CONFIG["lessons"][2]
+
+def test_index_is_rebuilt_when_config_changes(tmp_path):
+    path = write_config(tmp_path / "content.json", CONFIG)
+    ContentStore(path)
+    changed = {**CONFIG, "lessons": CONFIG["lessons"] + [{"lesson_number": 3.1, "title": "Nyt"}]}
+    write_config(path, changed)
+    store = ContentStore(path)
+    assert store.lesson_numbers() == [1.1, 1.2, 2.1, 3.1]
+    assert store.lesson(3.1) == {"lesson_number": 3.1, "title": "Nyt"}
+
+def test_index_is_rebuilt_on_same_size_edit(tmp_path):
+    path = write_config(tmp_path / "content.json", CONFIG)
+    ContentStore(path)
+    stat = path.stat()
+    edited = {**CONFIG, "lessons": [{**CONFIG["lessons"][0], "title": "Hvad hedder De?"}] + CONFIG["lessons"][1:]}
+    write_config(path, edited)
+    assert path.stat().st_size == stat.st_size
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert ContentStore(path).lesson(1.1)["title"] == "Hvad hedder De?"
+
+def test_corrupt_index_is_rebuilt(tmp_path):
+    path = write_config(tmp_path / "content.json", CONFIG)
+    index_path = tmp_path / "content.json.index.json"
+    index_path.write_text("{not json", encoding="utf-8")
+    assert ContentStore(path).config() == CONFIG
+    assert json.loads(index_path.read_text(encoding="utf-8"))["lessons"][0][0] == 1.1
+
+def test_unknown_lessons(tmp_path):
+    store = ContentStore(write_config(tmp_path / "content.json", CONFIG))
+    assert store.unknown([1.1, 9.9, 4.2]) == [9.9, 4.2]
+    with pytest.raises(KeyError):
+        store.lesson(9.9)
+    lessons = store.lessons([1.1, 9.9])
+    with pytest.raises(KeyError, match="9.9"):
+        next(lessons)
+
+def test_empty_lessons(tmp_path):
+    store = ContentStore(write_config(tmp_path / "content.json", {"lessons": [], "course": "x"}))
+    assert len(store) == 0
+    assert store.config() == {"course": "x", "lessons": []}
+
+def test_scan_reports_character_spans():
+    text = json.dumps(CONFIG, ensure_ascii=False)
+    header, spans = scan_content_config(text)
+    assert header == {"course": CONFIG["course"], "levels": CONFIG["levels"]}
+    assert [json.loads(text[start:end]) for _, start, end in spans] == CONFIG["lessons"]
+
+def test_scan_rejects_malformed_config():
+    with pytest.raises(ValueError):
+        scan_content_config('{"lessons": [{"lesson_number": 1.1} {"lesson_number": 1.2}]}')
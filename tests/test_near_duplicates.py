@@ -0,0 +1,96 @@
+import random
+
+import numpy as np
+import pytest
+
+from near_duplicates import PhraseEntry, find_duplicates, ngrams, normalize, similar_pairs, vectorize
+
+WORDS = ["jeg", "hedder", "du", "hvad", "en", "kaffe", "tak", "må", "få", "øl", "hvor", "bor", "i", "københavn"]
+
+def random_phrases(count, seed=0):
+    rng = random.Random(seed)
+    return [normalize(" ".join(rng.choices(WORDS, k=rng.randint(1, 8)))) for _ in range(count)]
+
+def brute_force(matrix, threshold):
+    sims = matrix @ matrix.T
+    i, j = np.nonzero(np.triu(sims >= threshold, k=1))
+    return {(a, b): sims[a, b] for a, b in zip(i.tolist(), j.tolist())}
+
+@pytest.mark.parametrize("threshold", [0.0, 0.3, 0.6, 0.75, 0.9])
+@pytest.mark.parametrize("block_size", [1, 7, 1024])
+def test_similar_pairs_matches_brute_force(threshold, block_size):
+    matrix = vectorize(random_phrases(300), dimensions=256)
+    firsts, seconds, scores = similar_pairs(matrix, threshold, block_size)
+    found = dict(zip(zip(firsts.tolist(), seconds.tolist()), scores.tolist()))
+    assert len(found) == len(firsts)
+    assert all(a < b for a, b in found)
+
+    # Blocked products may round differently from the full one right at the threshold
+    assert set(found) <= set(brute_force(matrix, threshold - 1e-5))
+    assert set(brute_force(matrix, threshold + 1e-5)) <= set(found)
+    expected = brute_force(matrix, -1.0)
+    for pair, score in found.items():
+        assert score == pytest.approx(expected[pair], abs=1e-5)
+
+def test_similar_pairs_of_nothing():
+    firsts, seconds, scores = similar_pairs(vectorize([]))
+    assert len(firsts) == len(seconds) == len(scores) == 0
+
+def test_vectorize_gives_cosine_similarity():
+    matrix = vectorize(["hej med dig", "hej med dig", "farvel"])
+    assert np.linalg.norm(matrix, axis=1) == pytest.approx([1.0, 1.0, 1.0])
+    assert matrix[0] @ matrix[1] == pytest.approx(1.0)
+    assert matrix[0] @ matrix[2] < 0.3
+
+def test_ngrams_are_padded():
+    assert ngrams("du") == [" du", "du "]
+    assert ngrams("", 3) == ["  "]
+
+def entry(text, source, group=None, origin="lesson"):
+    return PhraseEntry(text, source, group or source, origin)
+
+def sources(clusters):
+    return [sorted(member.source for member in cluster.members) for cluster in clusters]
+
+def test_exact_duplicates_after_normalization():
+    clusters = find_duplicates([
+        entry("Hvad hedder du?", "a"),
+        entry("hvad  hedder du", "b"),
+        entry("Hvor bor du?", "c"),
+    ])
+    assert sources(clusters) == [["a", "b"]]
+    assert clusters[0].similarity == 1.0
+
+def test_near_duplicates_are_clustered():
+    clusters = find_duplicates([
+        entry("Jeg hedder Søren", "a"),
+        entry("Jeg hedder Sørens", "b"),
+        entry("Må jeg få en øl?", "c"),
+    ], threshold=0.7)
+    assert sources(clusters) == [["a", "b"]]
+    assert 0.7 <= clusters[0].similarity < 1.0
+
+def test_same_group_is_never_linked():
+    clusters = find_duplicates([
+        entry("Jeg hedder Søren", "phrase", group="lesson 1.1 phrase 1"),
+        entry("Jeg hedder Søren!", "modification", group="lesson 1.1 phrase 1"),
+    ])
+    assert clusters == []
+
+def test_exact_duplicates_sharing_the_first_group_still_join():
+    clusters = find_duplicates([
+        entry("Hej med dig", "a", group="g1"),
+        entry("hej, med dig!", "b", group="g1"),
+        entry("Hej med dig", "c", group="g2"),
+    ])
+    assert sources(clusters) == [["a", "b", "c"]]
+
+def test_clusters_are_sorted_most_similar_first():
+    clusters = find_duplicates([
+        entry("Jeg bor i København", "a"),
+        entry("Jeg bor i Københavns", "b"),
+        entry("Hvad hedder du", "c"),
+        entry("hvad hedder du?", "d"),
+    ], threshold=0.7)
+    assert sources(clusters) == [["c", "d"], ["a", "b"]]
+    assert clusters[0].similarity > clusters[1].similarity
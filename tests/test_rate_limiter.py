@@ -0,0 +1,161 @@
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket, get_retry_after, is_retryable_status
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock instantly."""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class ApiError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        headers = {} if retry_after is None else {"retry-after": retry_after}
+        self.response = SimpleNamespace(headers=headers)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+def test_bucket_refills_continuously(clock):
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(1, 0.0) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1, 0.0) == pytest.approx(1.0)
+    assert bucket.wait_time(1, 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, 1.0) == pytest.approx(0.0)
+
+def test_bucket_oversized_request_waits_for_full_bucket(clock):
+    bucket = TokenBucket(10)
+    bucket.take(10)
+    # 100 tokens can never fit; waiting for all 10 takes a minute
+    assert bucket.wait_time(100, 0.0) == pytest.approx(60.0)
+
+def test_bucket_debt_delays_later_callers(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    bucket.adjust(30, 0.0)
+    assert bucket.tokens == pytest.approx(-30)
+    assert bucket.wait_time(1, 0.0) == pytest.approx(31.0)
+
+def test_acquire_paces_requests(clock):
+    limiter = RateLimiter(requests_per_minute=60, input_tokens_per_minute=1e9, output_tokens_per_minute=1e9)
+    for _ in range(60):
+        limiter.acquire(1, 1)
+    assert clock.now == 0.0
+    limiter.acquire(1, 1)
+    assert clock.now == pytest.approx(1.0)
+    assert all(s <= 1.0 for s in clock.sleeps)
+
+def test_settle_refunds_overestimates(clock):
+    limiter = RateLimiter(requests_per_minute=1000, input_tokens_per_minute=1000, output_tokens_per_minute=1000)
+    limiter.acquire(1000, 0)
+    limiter.settle(1000, 0, 100, 0)
+    limiter.acquire(900, 0)
+    assert clock.sleeps == []
+
+def test_call_retries_with_retry_after(clock):
+    limiter = RateLimiter(base_delay=0.0)
+    outcomes = [ApiError(503, retry_after="2"), "done"]
+    calls = []
+
+    def fn():
+        calls.append(clock.now)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call(fn, 10, 10) == "done"
+    assert calls == [0.0, pytest.approx(2.0)]
+
+def test_call_pauses_every_caller_on_429(clock):
+    limiter = RateLimiter(base_delay=0.0)
+    outcomes = [ApiError(429, retry_after="3"), "done"]
+
+    def fn():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call(fn, 10, 10) == "done"
+    assert clock.now == pytest.approx(3.0)
+    # A second caller is not held back once the pause is over
+    sleeps = len(clock.sleeps)
+    limiter.acquire(1, 1)
+    assert len(clock.sleeps) == sleeps
+
+def test_call_refunds_failed_attempts(clock):
+    limiter = RateLimiter(input_tokens_per_minute=1000, output_tokens_per_minute=500)
+
+    def fn():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.call(fn, 1000, 500)
+    assert limiter.input_tokens.tokens == pytest.approx(1000)
+    assert limiter.output_tokens.tokens == pytest.approx(500)
+
+def test_call_does_not_retry_other_errors(clock):
+    limiter = RateLimiter()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ApiError(400)
+
+    with pytest.raises(ApiError):
+        limiter.call(fn, 1, 1)
+    assert len(calls) == 1
+
+def test_call_gives_up_after_max_retries(clock):
+    limiter = RateLimiter(max_retries=3, base_delay=0.01)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ApiError(529)
+
+    with pytest.raises(ApiError):
+        limiter.call(fn, 1, 1)
+    assert len(calls) == 4
+
+def test_backoff_delay_bounds(monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+    limiter = RateLimiter(base_delay=1.0, max_delay=60.0)
+    assert limiter.backoff_delay(0) == 1.0
+    assert limiter.backoff_delay(3) == 8.0
+    assert limiter.backoff_delay(10) == 60.0
+    assert limiter.backoff_delay(10, retry_after=5.0) == 6.0
+
+@pytest.mark.parametrize("header, expected", [
+    ("3", 3.0),
+    ("0.5", 0.5),
+    ("-1", 0.0),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", None),
+    (None, None),
+])
+def test_get_retry_after(header, expected):
+    assert get_retry_after(ApiError(429, retry_after=header)) == expected
+
+def test_get_retry_after_without_response():
+    assert get_retry_after(ValueError("no response")) is None
+
+@pytest.mark.parametrize("status, retryable", [(429, True), (529, True), (503, True), (400, False), (401, False)])
+def test_is_retryable_status(status, retryable):
+    assert is_retryable_status(ApiError(status)) is retryable
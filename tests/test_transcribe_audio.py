@@ -0,0 +1,97 @@
+import csv
+import shutil
+from collections import Counter
+from pathlib import Path
+
+import pytest
+from pydub import AudioSegment
+
+import transcribe_audio_eleven_labs as tts
+from build_manifest import BuildManifest
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+
+VOICE_CONFIG = Path(__file__).resolve().parent.parent / "resources" / "voice_config.json"
+
+TRANSCRIPTS = {
+    "01_01_dialogue_focus": [
+        ("en_f_voice", "Welcome to the lesson", 1, 500),
+        ("da_f_voice", "Hej, jeg hedder Tim", 2, 700),
+    ],
+    "01_02_pattern_detective": [
+        ("en_f_voice", "Welcome to the lesson", 1, 500),
+        ("da_m_voice", "Hvad hedder du?", 1, 300),
+    ],
+}
+
+@pytest.fixture
+def course(tmp_path, monkeypatch):
+    """A one-lesson course whose clips are all in the audio cache already."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "resources").mkdir()
+    shutil.copy(VOICE_CONFIG, tmp_path / "resources" / "voice_config.json")
+    voice_mapper = tts.VoiceMapper()
+
+    transcript_dir = tmp_path / "danish" / "part_01" / "lesson_01" / "daily_transcripts"
+    transcript_dir.mkdir(parents=True)
+    Path("audio_cache").mkdir()
+    for name, rows in TRANSCRIPTS.items():
+        with open(transcript_dir / f"{name}.csv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["order_id", "voice_id", "text", "repeat", "delay"])
+            for order_id, (voice_id, text, repeat, delay) in enumerate(rows, 1):
+                writer.writerow([order_id, voice_id, text, repeat, delay])
+                path = tts.get_cache_path(tts.make_utterance(text, voice_id, voice_mapper))
+                if not path.exists():
+                    AudioSegment.silent(duration=400 + 100 * order_id, frame_rate=44100).export(path, format="mp3")
+    return tmp_path / "danish"
+
+@pytest.fixture
+def counts(monkeypatch):
+    counts = Counter()
+    monkeypatch.setattr(tts.metrics, "count", lambda name, value=1: counts.update({name: value}))
+    return counts
+
+def test_prefetched_cache_lookups_are_counted_once(course, counts):
+    assert tts.process_directory(str(course), prefetch=True)
+    # Three distinct utterances over four rows, each looked up once
+    assert counts["tts.cache.hits"] == 3
+    assert counts["tts.cache.misses"] == 0
+
+def test_cache_lookups_are_counted_without_prefetch(course, counts):
+    assert tts.process_directory(str(course), prefetch=False)
+    # Each transcript looks up its own utterances
+    assert counts["tts.cache.hits"] == 4
+    assert counts["tts.cache.misses"] == 0
+
+def test_lesson_duration_matches_cues(course):
+    assert tts.process_directory(str(course))
+    output = course / "part_01" / "lesson_01" / "audio" / "01_01_dialogue_focus.mp3"
+    sheet = tts.read_cue_sheet(output)
+    assert sheet["duration_ms"] == sheet["cues"][-1]["end_ms"]
+    assert len(AudioSegment.from_mp3(output)) == pytest.approx(sheet["duration_ms"], abs=100)
+
+def test_chunked_lesson_is_up_to_date_after_rendering(course):
+    manifest = BuildManifest(course, adopt_untracked=False)
+    assert tts.process_directory(str(course), chunk_duration_sec=1, manifest=manifest)
+
+    output = course / "part_01" / "lesson_01" / "audio" / "01_01_dialogue_focus.mp3"
+    chunks = tts.chunk_folder(output)
+    assert not output.exists()
+    assert tts.rendered_output(output) == chunks
+    sheet = tts.read_cue_sheet(output)
+    assert [chunks.parent / c for c in sheet["chunks"]] == sorted(chunks.glob("*.mp3"))
+    assert len(sheet["chunks"]) >= 2
+
+    reloaded = BuildManifest(course, adopt_untracked=False)
+    assert tts.collect_audio_jobs(course, chunk_duration_sec=1, manifest=reloaded, voice_mapper=tts.VoiceMapper()) == []
+
+def test_rendered_output_follows_cue_sheet(tmp_path):
+    output = tmp_path / "lesson.mp3"
+    assert tts.rendered_output(output) == output
+    tts.write_cue_sheet(output, 1000, [])
+    assert tts.rendered_output(output) == output
+    tts.write_cue_sheet(output, 1000, [], chunks=["lesson_chunks/chunk_1.mp3"])
+    assert tts.rendered_output(output) == tmp_path / "lesson_chunks"
+    tts.cue_sheet_path(output).write_text("{broken", encoding="utf-8")
+    assert tts.rendered_output(output) == output